@@ -14,6 +14,7 @@ from pathlib import Path
 
 from .utils import find_env
 from django.utils import timezone
+from celery.schedules import crontab
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,6 +31,41 @@ TELEGRAM_API_KEY = find_env('TELEGRAM_API_KEY')
 
 TELEGRAM_BOT_URL = find_env('TELEGRAM_BOT_URL')
 
+TELEGRAM_API_URL = 'https://api.telegram.org'
+
+# Клиент доставки напоминаний, лимиты Telegram:
+# около 30 сообщений в секунду всего и 1 сообщение в секунду в чат.
+# Общий лимит считается в кэше и делится всеми процессами воркеров
+TELEGRAM_CONNECT_TIMEOUT = 3.05
+TELEGRAM_READ_TIMEOUT = 10
+TELEGRAM_POOL_SIZE = 10
+TELEGRAM_RATE_LIMIT = 30
+TELEGRAM_CHAT_RATE_LIMIT = 1
+TELEGRAM_MAX_WAIT = 1
+TELEGRAM_FAILURE_THRESHOLD = 5
+TELEGRAM_RESET_TIMEOUT = 30
+TELEGRAM_MAX_RETRIES = 5
+
+# Режим webhook бота, без адреса бот работает через polling.
+# Адрес публичный, Telegram присылает обновления через nginx
+TELEGRAM_WEBHOOK_URL = find_env('TELEGRAM_WEBHOOK_URL')
+TELEGRAM_WEBHOOK_SECRET = find_env('TELEGRAM_WEBHOOK_SECRET')
+TELEGRAM_WEBHOOK_PATH = '/telegram/webhook/'
+TELEGRAM_WEBHOOK_HOST = '0.0.0.0'
+TELEGRAM_WEBHOOK_PORT = 8081
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = 40
+
+# Пул asyncpg для запросов чтения обработчиков бота
+TELEGRAM_DB_POOL_MIN_SIZE = 1
+TELEGRAM_DB_POOL_MAX_SIZE = 10
+
+# Кэш пользователей бота по id чата, сек. и число записей.
+# Изменения пользователя приходят через канал уведомлений PostgreSQL,
+# время жизни ограничивает устаревание при потере соединения
+TELEGRAM_USER_CACHE_TIMEOUT = 5*60
+TELEGRAM_USER_CACHE_MAX_ENTRIES = 10000
+TELEGRAM_USER_CHANNEL = 'bot_user_changed'
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
@@ -52,6 +88,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # full-text and trigram search
+    'django.contrib.postgres',
     # redoc
     'drf_yasg',
     # celery
@@ -116,6 +154,12 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Наибольшее число привычек в одном запросе массового создания
+HABIT_BULK_CREATE_LIMIT = 100
+
+# Размер пачки привычек читаемой курсором при выгрузке
+HABITS_EXPORT_CHUNK_SIZE = 500
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -142,6 +186,63 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_BEAT_SCHEDULER = find_env('DEFAULT_DATABASE_BEAT')
 
 
+# Reminders
+
+# В режиме диспетчера вместо отдельной PeriodicTask на каждую привычку
+# одна задача beat раз в минуту выбирает наступившие напоминания
+REMINDER_DISPATCHER = find_env('REMINDER_DISPATCHER') == 'True'
+REMINDER_DISPATCH_BATCH_SIZE = 100
+# Число одновременных отправок в пачке. Задачи отправки идут
+# в очередь reminders, ее воркер запущен с пулом gevent
+# (compose/django/celery/reminders/start), иначе отправки пачки
+# выполняются по очереди
+REMINDER_SEND_CONCURRENCY = 20
+REMINDER_QUEUE = 'reminders'
+
+CELERY_TASK_ROUTES = {
+    'habits.tasks.send_habit_raminder': {'queue': REMINDER_QUEUE},
+    'habits.tasks.send_habit_raminder_batch': {'queue': REMINDER_QUEUE},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch_habit_raminders': {
+        'task': 'habits.tasks.dispatch_habit_raminders',
+        'schedule': crontab(minute='*'),
+        'options': {'expires': 55},
+    },
+} if REMINDER_DISPATCHER else {}
+
+
+# Cache
+
+CACHE_LOCATION = find_env('CACHE_LOCATION')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Отрисованные напоминания, меняется только время отправки
+REMINDER_CACHE_TIMEOUT = 7*24*60*60
+
+# Кэш процесса перед общим кэшем, число записей
+LOCAL_CACHE_MAX_ENTRIES = 1000
+
+# Блокировка вычисления при промахе и ожидание чужого результата, сек.
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_WAIT = 2
+
+# Ответ списка личных привычек, ключ содержит версию привычек пользователя
+HABITS_LIST_CACHE_TIMEOUT = 24*60*60
+
+# Число первых страниц публичной ленты в общем кэше
+HABITS_PUBLIC_CACHED_PAGES = 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
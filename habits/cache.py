@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+MISSING = object()
+
+
+class LocalCache:
+    """Кэш процесса, ограниченный числом записей
+
+    Предназначен для ключей с версией, записи по которым
+    не меняются, поэтому сбрасывать его не нужно
+    """
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, MISSING)
+            if value is MISSING:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalCache(settings.LOCAL_CACHE_MAX_ENTRIES)
+
+
+def _initial_version() -> int:
+    """Начальная версия ключа
+
+    Берется из текущего времени, поэтому после вытеснения версии
+    из кэша новая версия не совпадет со старыми записями
+    """
+    return time.time_ns()
+
+
+def get_versions(keys: Iterable[str]) -> Dict[str, int]:
+    """Получение версий по ключам, отсутствующие версии создаются
+    """
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def get_version(key: str) -> int:
+    """Получение версии по ключу
+    """
+    return get_versions([key])[key]
+
+
+def bump_versions(keys: Iterable[str]) -> None:
+    """Увеличение версий, записи со старыми версиями становятся недоступны
+    """
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def bump_versions_on_commit(keys: Iterable[str]) -> None:
+    """Увеличение версий после фиксации транзакции
+
+    Иначе параллельный запрос успеет закэшировать
+    еще не зафиксированное состояние под новой версией
+    """
+    keys = list(keys)
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def _wait_for(key: str, timeout: float) -> Any:
+    """Ожидание значения которое вычисляет другой процесс
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+    return MISSING
+
+
+def get_or_compute(key: str,
+                   compute: Callable[[], Any],
+                   timeout: int,
+                   ) -> Any:
+    """Значение по ключу с версией из кэша процесса, общего кэша
+    или вычисленное через compute
+
+    При промахе значение вычисляет только получивший блокировку
+    через cache.add, остальные ждут его результат
+    не дольше CACHE_LOCK_WAIT и только потом считают сами
+    """
+    value = local_cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        lock = f'{key}:lock'
+        if cache.add(lock, 1, timeout=settings.CACHE_LOCK_TIMEOUT):
+            try:
+                value = compute()
+                cache.set(key, value, timeout=timeout)
+            finally:
+                cache.delete(lock)
+        else:
+            value = _wait_for(key, settings.CACHE_LOCK_WAIT)
+            if value is MISSING:
+                value = compute()
+    local_cache.set(key, value)
+    return value
@@ -0,0 +1,373 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from aiogram.enums import ParseMode
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class DeliveryError(Exception):
+    """Сообщение не может быть доставлено, повтор не поможет
+    """
+
+
+class DeliveryRetry(DeliveryError):
+    """Сообщение нужно отправить повторно не раньше чем через retry_after
+    """
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeliveryUnavailable(DeliveryRetry):
+    """Telegram API недоступен, цепь разомкнута
+    """
+
+
+class TokenBucket:
+    """Ведро токенов, ограничивает частоту отправки сообщений
+    """
+    def __init__(self, rate: float, capacity: Union[float, None] = None,
+                 ) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Пополнение токенов за прошедшее время
+        """
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate,
+            )
+        self.updated_at = now
+
+    def acquire(self, max_wait: float) -> Union[float, None]:
+        """Занимает токен если его можно получить не дольше max_wait
+
+        Returns:
+            Union[float, None]: Сколько секунд нужно подождать
+            перед отправкой, None если ожидание больше max_wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(
+                self.paused_until - now,
+                (1 - self.tokens) / self.rate,
+                0.0,
+                )
+            if wait > max_wait:
+                return
+            self.tokens -= 1
+            return wait
+
+    def release(self) -> None:
+        """Возврат занятого токена
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float) -> None:
+        """Запрет отправки на указанное время
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds,
+                                    )
+
+    def wait_time(self) -> float:
+        """Время до появления следующего токена
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return max(self.paused_until - now,
+                       (1 - self.tokens) / self.rate,
+                       0.0,
+                       )
+
+
+class SharedRateLimiter:
+    """Общее для всех процессов ограничение частоты сообщений
+
+    Сообщения считаются в окнах по секунде через cache.incr,
+    с Redis счетчик один на все процессы и реплики воркеров.
+    Пауза после 429 тоже хранится в кэше.
+    Интерфейс как у TokenBucket без release
+    """
+    WINDOW_KEY = 'telegram:rate:{}'
+    PAUSE_KEY = 'telegram:rate:paused'
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+
+    def _get_paused(self, now: float) -> float:
+        return max(cache.get(self.PAUSE_KEY, 0) - now, 0.0)
+
+    def _incr(self, second: int, timeout: float) -> int:
+        key = self.WINDOW_KEY.format(second)
+        if cache.add(key, 1, timeout=timeout):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Окно истекло между add и incr
+            cache.add(key, 1, timeout=timeout)
+            return 1
+
+    def acquire(self, max_wait: float) -> Union[float, None]:
+        """Занимает место в ближайшем окне не дальше max_wait
+
+        Returns:
+            Union[float, None]: Сколько секунд нужно подождать
+            перед отправкой, None если ожидание больше max_wait
+        """
+        now = time.time()
+        start = now + self._get_paused(now)
+        for second in range(int(start), int(now + max_wait) + 1):
+            if self._incr(second, max_wait + 2) <= self.rate:
+                return max(second - now, start - now, 0.0)
+        return
+
+    def pause(self, seconds: float) -> None:
+        """Запрет отправки всем процессам на указанное время
+        """
+        paused_until = time.time() + seconds
+        if paused_until > cache.get(self.PAUSE_KEY, 0):
+            cache.set(self.PAUSE_KEY, paused_until, timeout=math.ceil(seconds))
+
+    def wait_time(self) -> float:
+        """Время до следующего окна или конца паузы
+        """
+        now = time.time()
+        return max(self._get_paused(now), math.floor(now) + 1 - now)
+
+
+class CircuitBreaker:
+    """Размыкатель цепи для недоступного API
+
+    После failure_threshold ошибок подряд запросы не отправляются
+    reset_timeout секунд, затем пропускается один пробный запрос
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.remaining() > 0 or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def remaining(self) -> float:
+        """Сколько секунд цепь еще будет разомкнута
+        """
+        if self.opened_at is None:
+            return 0.0
+        return max(
+            self.opened_at + self.reset_timeout - time.monotonic(),
+            0.0,
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class TelegramDeliveryClient:
+    """Клиент отправки сообщений в Telegram
+
+    Держит пул соединений, ограничивает время запросов,
+    частоту отправки в целом и в каждый чат,
+    при недоступности API размыкает цепь.
+    Общий лимит по умолчанию свой у каждого клиента,
+    get_delivery_client передает общий для процессов SharedRateLimiter
+    """
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self,
+                 token: str,
+                 base_url: str = 'https://api.telegram.org',
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10,
+                 pool_size: int = 10,
+                 rate_limit: float = 30,
+                 chat_rate_limit: float = 1,
+                 max_wait: float = 1,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30,
+                 bucket: Union[TokenBucket, SharedRateLimiter, None] = None,
+                 ) -> None:
+        self.url = f'{base_url.rstrip("/")}/bot{token}/'
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_wait = max_wait
+        self.chat_rate_limit = chat_rate_limit
+        self.bucket = bucket or TokenBucket(rate_limit)
+        self.chat_buckets = OrderedDict()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=pool_size,
+                              pool_block=True,
+                              )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get_chat_bucket(self, id_chat: int) -> TokenBucket:
+        """Ведро токенов чата, редко используемые вытесняются
+        """
+        with self._lock:
+            bucket = self.chat_buckets.get(id_chat)
+            if bucket is None:
+                bucket = TokenBucket(self.chat_rate_limit, 1)
+                self.chat_buckets[id_chat] = bucket
+                if len(self.chat_buckets) > self.MAX_CHAT_BUCKETS:
+                    self.chat_buckets.popitem(last=False)
+            else:
+                self.chat_buckets.move_to_end(id_chat)
+            return bucket
+
+    def _throttle(self, chat_bucket: TokenBucket) -> None:
+        """Ожидание токенов, долгое ожидание переносится в повтор
+        """
+        chat_wait = chat_bucket.acquire(self.max_wait)
+        if chat_wait is None:
+            raise DeliveryRetry('Превышен лимит сообщений в чат',
+                                chat_bucket.wait_time(),
+                                )
+        wait = self.bucket.acquire(self.max_wait)
+        if wait is None:
+            chat_bucket.release()
+            raise DeliveryRetry('Превышен лимит сообщений',
+                                self.bucket.wait_time(),
+                                )
+        wait = max(wait, chat_wait)
+        if wait:
+            time.sleep(wait)
+
+    def call(self, method: str, chat_bucket: TokenBucket, data: dict,
+             ) -> dict:
+        """Вызов метода Telegram API
+        """
+        self._throttle(chat_bucket)
+        if not self.breaker.allow():
+            raise DeliveryUnavailable('Telegram API недоступен',
+                                      self.breaker.remaining(),
+                                      )
+        try:
+            response = self.session.post(f'{self.url}{method}',
+                                         data=data,
+                                         timeout=self.timeout,
+                                         )
+        except requests.RequestException as error:
+            self.breaker.record_failure()
+            raise DeliveryUnavailable(
+                f'Ошибка соединения с Telegram API: {error}',
+                self.breaker.remaining() or 1,
+                ) from error
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise DeliveryUnavailable(
+                f'Telegram API ответил {response.status_code}',
+                self.breaker.remaining() or 1,
+                )
+        self.breaker.record_success()
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code == 429:
+            retry_after = payload.get('parameters', {}).get(
+                'retry_after',
+                response.headers.get('Retry-After', 1),
+                )
+            # Flood wait касается всего бота, остальные
+            # сообщения пачки тоже получили бы 429
+            chat_bucket.pause(float(retry_after))
+            self.bucket.pause(float(retry_after))
+            raise DeliveryRetry(
+                payload.get('description', 'Too Many Requests'),
+                float(retry_after),
+                )
+        if not response.ok:
+            raise DeliveryError(
+                payload.get('description', response.reason),
+                )
+        return payload
+
+    def send_message(self,
+                     id_chat: int,
+                     text: str,
+                     parse_mode: str = ParseMode.HTML,
+                     ) -> dict:
+        """Отправка сообщения в чат
+        """
+        return self.call(
+            'sendMessage',
+            self._get_chat_bucket(id_chat),
+            {'chat_id': id_chat, 'text': text, 'parse_mode': parse_mode},
+            )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_delivery_client() -> TelegramDeliveryClient:
+    """Общий клиент доставки процесса
+
+    Создается при первом обращении, поэтому каждый
+    процесс воркера получает свой пул соединений.
+    Общий лимит сообщений делится между процессами через кэш
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TelegramDeliveryClient(
+                    token=settings.TELEGRAM_API_KEY,
+                    base_url=settings.TELEGRAM_API_URL,
+                    connect_timeout=settings.TELEGRAM_CONNECT_TIMEOUT,
+                    read_timeout=settings.TELEGRAM_READ_TIMEOUT,
+                    pool_size=settings.TELEGRAM_POOL_SIZE,
+                    rate_limit=settings.TELEGRAM_RATE_LIMIT,
+                    chat_rate_limit=settings.TELEGRAM_CHAT_RATE_LIMIT,
+                    max_wait=settings.TELEGRAM_MAX_WAIT,
+                    failure_threshold=settings.TELEGRAM_FAILURE_THRESHOLD,
+                    reset_timeout=settings.TELEGRAM_RESET_TIMEOUT,
+                    bucket=SharedRateLimiter(settings.TELEGRAM_RATE_LIMIT),
+                    )
+    return _client
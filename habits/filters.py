@@ -0,0 +1,71 @@
+import django_filters
+
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank,
+                                            SearchVector,
+                                            TrigramSimilarity,
+                                            )
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+from habits.models import Habit
+
+
+SEARCH_CONFIG = 'russian'
+
+_trigram_available = None
+
+
+def is_trigram_available() -> bool:
+    """Установлено ли расширение pg_trgm, проверяется один раз
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'",
+                )
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+class HabitSearchFilter(django_filters.FilterSet):
+    """Поиск публичных привычек по действию и месту
+
+    Полнотекстовый поиск идет по индексу habits_published_search_idx,
+    при установленном pg_trgm добавляются привычки похожие
+    на запрос с опечатками. Результат сортируется по рангу rank
+    """
+    search = django_filters.CharFilter(method='filter_search',
+                                       label='Поиск',
+                                       )
+
+    class Meta:
+        model = Habit
+        fields = ('search',)
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        query = SearchQuery(value,
+                            config=SEARCH_CONFIG,
+                            search_type='websearch',
+                            )
+        vector = SearchVector('action', 'place', config=SEARCH_CONFIG)
+        condition = Q(search_vector=query)
+        rank = SearchRank(vector, query)
+        if is_trigram_available():
+            condition |= (Q(action__trigram_similar=value)
+                          | Q(place__trigram_similar=value))
+            rank = rank + Greatest(TrigramSimilarity('action', value),
+                                   TrigramSimilarity('place', value),
+                                   )
+        # Ранг в double precision точно переживает курсор,
+        # real из ts_rank при разборе в Python теряет точность
+        return queryset.alias(
+            search_vector=vector,
+            ).filter(condition).annotate(
+                rank=Cast(rank, FloatField()),
+                ).order_by('-rank', 'id')
@@ -1,9 +1,205 @@
+import threading
+from collections import OrderedDict
 from datetime import timedelta
-from typing import Tuple, Union
+from typing import Dict, Iterable, Tuple, Union
 
+from django.core.cache import cache
+from django.db import connection, transaction
 from django_celery_beat.models import CrontabSchedule
 
 
+CrontabKey = Tuple[str, str, str]
+
+
+class HandleCrontab:
+    """Получение кронтабов по минуте, часу и дню месяца
+
+    Кронтаб создается запросом INSERT ... ON CONFLICT DO NOTHING
+    по уникальному индексу, существующий выбирается вторым запросом,
+    id кронтабов кэшируются в процессе и в общем кэше
+    """
+    CACHE_KEY = 'habits:crontab:{}:{}:{}:{}'
+    CACHE_TIMEOUT = 60 * 60 * 24
+    MAX_LOCAL = 1024
+    _local = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_timezone(cls):
+        """Часовой пояс кронтабов по умолчанию
+        """
+        return CrontabSchedule._meta.get_field('timezone').get_default()
+
+    @classmethod
+    def _build(cls, pk: int, key: tuple, tz) -> CrontabSchedule:
+        """Сборка сохраненного кронтаба без обращения к БД
+        """
+        minute, hour, day_of_month = key
+        crontab = CrontabSchedule(id=pk,
+                                  minute=minute,
+                                  hour=hour,
+                                  day_of_week='*',
+                                  day_of_month=day_of_month,
+                                  month_of_year='*',
+                                  timezone=tz,
+                                  )
+        crontab._state.adding = False
+        crontab._state.db = connection.alias
+        return crontab
+
+    @classmethod
+    def _get_local(cls, keys: Iterable[tuple]) -> Dict[tuple, int]:
+        """id кронтабов из кэша процесса
+        """
+        ids = {}
+        with cls._lock:
+            for key in keys:
+                pk = cls._local.get(key)
+                if pk is not None:
+                    cls._local.move_to_end(key)
+                    ids[key] = pk
+        return ids
+
+    @classmethod
+    def _set_local(cls, ids: Dict[tuple, int]) -> None:
+        """Запись id кронтабов в кэш процесса, старые вытесняются
+        """
+        with cls._lock:
+            cls._local.update(ids)
+            while len(cls._local) > cls.MAX_LOCAL:
+                cls._local.popitem(last=False)
+
+    @classmethod
+    def _remember(cls, ids: Dict[tuple, int]) -> None:
+        """Запись id кронтабов в оба кэша
+        """
+        cls._set_local(ids)
+        cache.set_many(
+            {cls.CACHE_KEY.format(*key): pk for key, pk in ids.items()},
+            timeout=cls.CACHE_TIMEOUT,
+            )
+
+    @classmethod
+    def _upsert(cls, keys: Iterable[CrontabKey], tz_name: str,
+                ) -> Dict[CrontabKey, int]:
+        """Поиск или создание кронтабов
+
+        Вставка пропускает существующие строки и не пишет в них,
+        id существующих выбираются вторым запросом только если
+        вставка вернула не все ключи. Ключи сортируются, чтобы
+        параллельные запросы ждали друг друга в одном порядке
+        """
+        keys = sorted(keys)
+        table = connection.ops.quote_name(CrontabSchedule._meta.db_table)
+        values = ', '.join(["(%s, %s, '*', %s, '*', %s)"] * len(keys))
+        params = [value
+                  for minute, hour, day_of_month in keys
+                  for value in (minute, hour, day_of_month, tz_name)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                '(minute, hour, day_of_week, day_of_month, '
+                'month_of_year, timezone) '
+                f'VALUES {values} '
+                'ON CONFLICT (minute, hour, day_of_week, day_of_month, '
+                'month_of_year, timezone) '
+                'DO NOTHING '
+                'RETURNING id, minute, hour, day_of_month',
+                params,
+                )
+            ids = {(minute, hour, day_of_month): pk
+                   for pk, minute, hour, day_of_month in cursor.fetchall()}
+            existing = [key for key in keys if key not in ids]
+            if existing:
+                # Отдельный запрос видит строки зафиксированные
+                # параллельной вставкой, которую ждал INSERT
+                cursor.execute(
+                    f'SELECT id, minute, hour, day_of_month FROM {table} '
+                    'WHERE (minute, hour, day_of_month) IN ('
+                    f'{", ".join(["(%s, %s, %s)"] * len(existing))}) '
+                    "AND day_of_week = '*' AND month_of_year = '*' "
+                    'AND timezone = %s',
+                    [value for key in existing for value in key] + [tz_name],
+                    )
+                ids.update(
+                    ((minute, hour, day_of_month), pk)
+                    for pk, minute, hour, day_of_month in cursor.fetchall()
+                    )
+            return ids
+
+    @classmethod
+    def get_key(cls,
+                minute: Union[int, str],
+                hour: Union[int, str],
+                day_of_month: Union[int, str],
+                ) -> CrontabKey:
+        """Ключ кронтаба в виде как он хранится в БД
+        """
+        return str(minute), str(hour), str(day_of_month)
+
+    @classmethod
+    def resolve(cls, keys: Iterable[tuple],
+                ) -> Dict[CrontabKey, CrontabSchedule]:
+        """Получение кронтабов по ключам (минута, час, день месяца)
+
+        Результат по ключам приведенным к строкам, поля
+        кронтабов сохраняют переданные значения
+
+        Созданные кронтабы попадают в кэш только после фиксации
+        транзакции, иначе после отката в кэше останется
+        id несуществующей строки
+        """
+        tz = cls._get_timezone()
+        tz_name = str(tz)
+        values = {cls.get_key(*key): key for key in keys}
+        keys = values.keys()
+        cache_keys = {(tz_name, *key): key for key in keys}
+
+        ids = {cache_keys[cache_key]: pk
+               for cache_key, pk
+               in cls._get_local(cache_keys).items()}
+        missing = {cache_key: key
+                   for cache_key, key in cache_keys.items()
+                   if key not in ids}
+        if missing:
+            shared = {cls.CACHE_KEY.format(*cache_key): cache_key
+                      for cache_key in missing}
+            found = {shared[name]: pk
+                     for name, pk in cache.get_many(shared).items()}
+            cls._set_local(found)
+            ids.update((missing[cache_key], pk)
+                       for cache_key, pk in found.items())
+
+        unresolved = keys - ids.keys()
+        if unresolved:
+            created = cls._upsert(unresolved, tz_name)
+            ids.update(created)
+            created = {(tz_name, *key): pk for key, pk in created.items()}
+            transaction.on_commit(lambda: cls._remember(created))
+
+        return {key: cls._build(pk, values[key], tz)
+                for key, pk in ids.items()}
+
+    @classmethod
+    def get(cls,
+            minute: Union[int, str],
+            hour: Union[int, str],
+            day_of_month: Union[int, str],
+            ) -> CrontabSchedule:
+        """Получение кронтаба, при отсутствии он создается
+        """
+        key = (minute, hour, day_of_month)
+        crontab, = cls.resolve([key]).values()
+        return crontab
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        """Очистка кэша процесса
+        """
+        with cls._lock:
+            cls._local.clear()
+
+
 class HandleInterval:
     """Обработчик интервала
     """
@@ -36,56 +232,36 @@ class HandleInterval:
             return f'*/{int(minute)}', 'minutes'
 
     @classmethod
-    def _get_or_set_interval(cls,
-                             value: int,
-                             type_of_time: str) -> CrontabSchedule:
-        """Получение или создание интервала
+    def _get_interval_key(cls,
+                          value: int,
+                          type_of_time: str) -> tuple:
+        """Минута, час и день месяца интервала
         """
         match value, type_of_time:
             case _, 'days':
-                interval = CrontabSchedule.objects.filter(
-                    minute='*',
-                    hour='*',
-                    day_of_month=value,
-                    )
-                if not interval.exists():
-                    interval = CrontabSchedule.objects.create(
-                        minute='*',
-                        hour='*',
-                        day_of_month=value,
-                        )
-                    return interval
-                return interval.get()
+                return '*', '*', value
 
             case _, 'hours':
-                interval = CrontabSchedule.objects.filter(
-                    minute='*',
-                    hour=value,
-                    day_of_month='*',
-                    )
-                if not interval.exists():
-                    interval = CrontabSchedule.objects.create(
-                        minute='*',
-                        hour=value,
-                        day_of_month='*',
-                        )
-                    return interval
-                return interval.get()
+                return '*', value, '*'
 
             case _, 'minutes':
-                interval = CrontabSchedule.objects.filter(
-                    minute=value,
-                    hour='*',
-                    day_of_month='*',
-                    )
-                if not interval.exists():
-                    interval = CrontabSchedule.objects.create(
-                        minute=value,
-                        hour='*',
-                        day_of_month='*',
-                        )
-                    return interval
-                return interval.get()
+                return value, '*', '*'
+
+    @classmethod
+    def _get_or_set_interval(cls,
+                             value: int,
+                             type_of_time: str) -> CrontabSchedule:
+        """Получение или создание интервала
+        """
+        return HandleCrontab.get(
+            *cls._get_interval_key(value, type_of_time),
+            )
+
+    @classmethod
+    def get_interval_key(cls, value: Union[str, None]) -> tuple:
+        """Ключ кронтаба интервала без обращения к БД
+        """
+        return cls._get_interval_key(*cls._get_parse_interval(value))
 
     @classmethod
     def get_interval(cls,
@@ -134,19 +310,14 @@ class HandleTimeToDo:
                                  ) -> CrontabSchedule:
         """Получение или создание Crontab времени
         """
-        crontab_time = CrontabSchedule.objects.filter(
-            hour=hour,
-            minute=minute,
-            day_of_month='*',
-            )
-        if not crontab_time.exists():
-            crontab_time = CrontabSchedule.objects.create(
-                hour=hour,
-                minute=minute,
-                day_of_month='*',
-                )
-            return crontab_time
-        return crontab_time.get()
+        return HandleCrontab.get(minute, hour, '*')
+
+    @classmethod
+    def get_crontab_time_key(cls, value: str) -> tuple:
+        """Ключ кронтаба времени без обращения к БД
+        """
+        hour, minute = cls._parse_time(value)
+        return minute, hour, '*'
 
     @classmethod
     def get_crontab_time(cls, value: str) -> CrontabSchedule:
@@ -252,19 +423,46 @@ class HandleCronScheduleToTask:
                                  ) -> CrontabSchedule:
         """Получение или создание Crontab времени
         """
-        crontab_time = CrontabSchedule.objects.filter(
-            hour=hour,
+        return HandleCrontab.get(minute, hour, day_of_month)
+
+    @classmethod
+    def construct_interval_to_task(cls,
+                                   cron_to_do: CrontabSchedule,
+                                   cron_interval: CrontabSchedule,
+                                   ) -> CrontabSchedule:
+        """Собирает кронтаб задачи без обращения к БД
+        """
+        cls._check_cron_instance(cron_to_do,
+                                 cron_interval,
+                                 )
+        minute, hour, day_of_month = cls._parse_cron_intervals(
+            cron_to_do,
+            cron_interval,
+            )
+        return CrontabSchedule(
             minute=minute,
+            hour=hour,
             day_of_month=day_of_month,
             )
-        if not crontab_time.exists():
-            crontab_time = CrontabSchedule.objects.create(
-                hour=hour,
-                minute=minute,
-                day_of_month=day_of_month,
-                )
-            return crontab_time
-        return crontab_time.get()
+
+    @classmethod
+    def get_interval_to_task_key(cls,
+                                 to_do_key: tuple,
+                                 interval_key: tuple,
+                                 ) -> tuple:
+        """Ключ кронтаба задачи по ключам времени и интервала
+        """
+        minute, hour, day_of_month = to_do_key
+        cron_to_do = CrontabSchedule(minute=minute,
+                                     hour=hour,
+                                     day_of_month=day_of_month,
+                                     )
+        minute, hour, day_of_month = interval_key
+        cron_interval = CrontabSchedule(minute=minute,
+                                        hour=hour,
+                                        day_of_month=day_of_month,
+                                        )
+        return cls._parse_cron_intervals(cron_to_do, cron_interval)
 
     @classmethod
     def get_interval_to_task(cls,
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from habits.models import Habit
+from habits.telegram_bot import db
+from habits.telegram_bot.utils import (get_minute_of_day,
+                                       render_habits,
+                                       render_next_habit,
+                                       )
+
+
+class Command(BaseCommand):
+    """Нагрузочная проверка запросов обработчиков бота
+
+    Каждое обновление повторяет команды /list и /next:
+    поиск пользователя, список привычек и следующая привычка.
+    Обновления выполняются одновременно через пул asyncpg
+    разного размера и через асинхронный ORM для сравнения
+    """
+    help = ('Сравнивает пропускную способность обработки обновлений '
+            'бота через пул asyncpg и асинхронный ORM')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tg-id',
+                            type=int,
+                            help='id чата пользователя, по умолчанию '
+                                 'первый пользователь с id чата',
+                            )
+        parser.add_argument('--updates',
+                            type=int,
+                            default=2000,
+                            help='Количество обновлений в прогоне',
+                            )
+        parser.add_argument('--concurrency',
+                            type=int,
+                            default=64,
+                            help='Одновременно обрабатываемые обновления',
+                            )
+        parser.add_argument('--pool-sizes',
+                            default='1,2,4,8',
+                            help='Размеры пула через запятую',
+                            )
+
+    async def handle_pool_update(self, tg_id: int) -> None:
+        user = await db.get_user(tg_id)
+        render_habits(await db.get_habits(user['id']))
+        habit, _ = await db.get_next_habit(user['id'], get_minute_of_day())
+        render_next_habit(habit)
+
+    async def handle_orm_update(self, tg_id: int) -> None:
+        """Обработка обновления как до пула, через асинхронный ORM
+        """
+        user = await get_user_model().objects.aget(tg_id=tg_id)
+        habits = Habit.objects.filter(owner=user)
+        render_habits([habit async for habit in habits])
+        render_next_habit(await habits.filter(
+            minute_of_day__gte=get_minute_of_day(),
+            ).afirst())
+
+    async def run(self, handle_update, tg_id: int,
+                  updates: int, concurrency: int,
+                  ) -> float:
+        """Обновлений в секунду при заданной конкурентности
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def process():
+            async with semaphore:
+                await handle_update(tg_id)
+
+        # Прогрев соединений
+        await asyncio.gather(*(process() for _ in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(process() for _ in range(updates)))
+        elapsed = time.perf_counter() - start
+        await db.close_pool()
+        return updates / elapsed
+
+    def handle(self, *args, **options):
+        tg_id = options['tg_id']
+        if tg_id is None:
+            tg_id = get_user_model().objects.filter(
+                tg_id__isnull=False,
+                ).values_list('tg_id', flat=True).first()
+        if tg_id is None or not get_user_model().objects.filter(
+                tg_id=tg_id).exists():
+            raise CommandError('Нет пользователя с id чата')
+        try:
+            pool_sizes = [int(size)
+                          for size in options['pool_sizes'].split(',')]
+        except ValueError:
+            raise CommandError('Размеры пула должны быть числами')
+        updates, concurrency = options['updates'], options['concurrency']
+
+        rate = asyncio.run(self.run(self.handle_orm_update, tg_id,
+                                    updates, concurrency))
+        self.stdout.write(f'ORM: {rate:.0f} обновлений/с')
+        for size in pool_sizes:
+            with override_settings(TELEGRAM_DB_POOL_MIN_SIZE=size,
+                                   TELEGRAM_DB_POOL_MAX_SIZE=size,
+                                   ):
+                rate = asyncio.run(self.run(self.handle_pool_update, tg_id,
+                                            updates, concurrency))
+            self.stdout.write(f'asyncpg, пул {size}: '
+                              f'{rate:.0f} обновлений/с')
@@ -0,0 +1,186 @@
+import csv
+import json
+import os
+from typing import Iterator, List, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.models import Habit
+from habits.serializers import HabitBulkCreateSearilizer
+from habits.services import copy_create_habits, invalidate_habit_lists
+
+
+class Command(BaseCommand):
+    """Загрузка привычек из CSV или NDJSON файла
+
+    Файл читается построчно, строки проверяются теми же
+    валидаторами что и при создании через API и загружаются
+    пачками через COPY, поэтому память не зависит от размера файла.
+    После каждой пачки сбрасываются списки привычек ее владельцев
+    """
+    help = ('Загружает привычки из CSV или NDJSON, '
+            'отклоненные строки записываются в отдельный файл')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с привычками')
+        parser.add_argument('--type',
+                            choices=('csv', 'ndjson'),
+                            help='Формат файла, по умолчанию '
+                                 'определяется по расширению',
+                            )
+        parser.add_argument('--owner',
+                            type=int,
+                            help='Владелец всех привычек, иначе '
+                                 'берется из поля owner строки',
+                            )
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=5000,
+                            help='Количество привычек в одной пачке',
+                            )
+        parser.add_argument('--rejected',
+                            help='Файл отклоненных строк, по умолчанию '
+                                 '<path>.rejected.ndjson',
+                            )
+
+    def read_rows(self, path: str, file_type: str,
+                  ) -> Iterator[Tuple[int, dict, str]]:
+        """Строки файла с номером и ошибкой разбора
+        """
+        with open(path, encoding='utf-8', newline='') as file:
+            if file_type == 'csv':
+                # Номер строки с учетом заголовка
+                for number, row in enumerate(csv.DictReader(file), 2):
+                    yield number, {key: value for key, value in row.items()
+                                   if value != ''}, None
+                return
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    yield number, line.rstrip('\n'), str(error)
+                    continue
+                if not isinstance(row, dict):
+                    yield number, row, 'Ожидается объект привычки'
+                    continue
+                yield number, row, None
+
+    def validate_chunk(self, chunk: List[Tuple[int, dict, str]],
+                       owner_id: int,
+                       ) -> Tuple[list, list]:
+        """Проверка пачки строк
+
+        Владельцы и связанные привычки пачки
+        загружаются двумя запросами
+
+        Returns:
+            Tuple[list, list]: Пары (владелец, данные) валидных строк
+            и отклоненные строки с ошибками
+        """
+        def get_ids(field):
+            ids = set()
+            for _, row, error in chunk:
+                if error is None:
+                    try:
+                        ids.add(int(row[field]))
+                    except (KeyError, TypeError, ValueError):
+                        pass
+            return ids
+
+        owners = get_user_model().objects.in_bulk(
+            {owner_id} if owner_id else get_ids('owner'),
+            )
+        context = {'related_habits': Habit.objects.only(
+            'id',
+            'owner_id',
+            'is_nice_habit',
+            'is_published',
+            ).in_bulk(get_ids('related_habit'))}
+
+        valid, rejected = [], []
+        for number, row, error in chunk:
+            if error is not None:
+                rejected.append({'line': number, 'row': row,
+                                 'errors': {'non_field_errors': [error]}})
+                continue
+            try:
+                owner = owners.get(owner_id or int(row.get('owner')))
+            except (TypeError, ValueError):
+                owner = None
+            if owner is None:
+                rejected.append({'line': number, 'row': row,
+                                 'errors': {'owner': ['Нет пользователя']}})
+                continue
+            serializer = HabitBulkCreateSearilizer(data=row, context=context)
+            if not serializer.is_valid():
+                rejected.append({'line': number, 'row': row,
+                                 'errors': serializer.errors})
+                continue
+            related = serializer.validated_data.get('related_habit')
+            if related is not None and related.owner_id != owner.pk:
+                rejected.append({'line': number, 'row': row, 'errors': {
+                    'related_habit': [
+                        'Связаная привычка может быть только ваша',
+                        ],
+                    }})
+                continue
+            valid.append((owner, dict(serializer.validated_data)))
+        return valid, rejected
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        file_type = options['type'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+            )
+        chunk_size = options['chunk_size']
+        rejected_path = options['rejected'] or f'{path}.rejected.ndjson'
+
+        crontabs = {}
+        processed = created = rejected_count = 0
+        with open(rejected_path, 'w', encoding='utf-8') as rejected_file:
+            def load(chunk):
+                nonlocal created, rejected_count
+                valid, rejected = self.validate_chunk(chunk,
+                                                      options['owner'],
+                                                      )
+                habits = copy_create_habits(valid, crontabs)
+                created += len(habits)
+                published = {}
+                for habit in habits:
+                    published[habit.owner_id] = (
+                        published.get(habit.owner_id, False)
+                        or habit.is_published
+                        )
+                for owner_id, is_published in published.items():
+                    invalidate_habit_lists(owner_id, is_published)
+                for item in rejected:
+                    rejected_file.write(
+                        json.dumps(item, ensure_ascii=False) + '\n',
+                        )
+                rejected_count += len(rejected)
+                self.stdout.write(
+                    f'Обработано строк: {processed}, '
+                    f'загружено: {created}, '
+                    f'отклонено: {rejected_count}',
+                    )
+
+            chunk = []
+            for row in self.read_rows(path, file_type):
+                chunk.append(row)
+                processed += 1
+                if len(chunk) >= chunk_size:
+                    load(chunk)
+                    chunk = []
+            if chunk:
+                load(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено привычек: {created}, отклонено: {rejected_count}',
+            ))
+        if rejected_count:
+            self.stdout.write(f'Отклоненные строки: {rejected_path}')
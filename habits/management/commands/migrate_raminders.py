@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from django_celery_beat.models import PeriodicTask
+
+from habits.models import Habit
+from habits.services import (PATH_REMINDER_TASK,
+                             REMINDER_SCHEDULE_FIELDS,
+                             reschedule_reminders,
+                             )
+
+
+class Command(BaseCommand):
+    """Перевод напоминаний с отдельных PeriodicTask на диспетчер
+    """
+    help = ('Назначает привычкам время следующего напоминания '
+            'и удаляет PeriodicTask каждой привычки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=2000,
+                            help='Количество привычек в одной пачке',
+                            )
+
+    def handle(self, *args, **options):
+        if not settings.REMINDER_DISPATCHER:
+            raise CommandError(
+                'Диспетчер напоминаний выключен, '
+                'установите REMINDER_DISPATCHER=True',
+                )
+        chunk_size = options['chunk_size']
+        now = timezone.now()
+        rows = Habit.objects.order_by().values_list(
+            'pk',
+            *REMINDER_SCHEDULE_FIELDS,
+            ).iterator(chunk_size=chunk_size)
+
+        with transaction.atomic():
+            scheduled = 0
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    scheduled += reschedule_reminders(chunk, now)
+                    chunk = []
+            scheduled += reschedule_reminders(chunk, now)
+            deleted, _ = PeriodicTask.objects.filter(
+                task=PATH_REMINDER_TASK,
+                ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Назначено напоминаний: {scheduled}, '
+            f'удалено задач: {deleted}',
+            ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0010_alter_habit_is_nice_habit_alter_habit_periodic_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Время следующей отправки напоминания, используется диспетчером напоминаний', null=True, verbose_name='следующее напоминание'),
+        ),
+    ]
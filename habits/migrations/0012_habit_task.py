@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('habits', '0011_habit_next_reminder_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='task',
+            field=models.OneToOneField(blank=True, editable=False, help_text='Периодическая задача отправки напоминаний привычки', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='habit', to='django_celery_beat.periodictask', verbose_name='задача напоминания'),
+        ),
+    ]
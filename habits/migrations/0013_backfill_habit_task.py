@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Связывание привычек с задачами созданными до появления связи,
+    имя задачи строится как task_raminder_<habit>/U-<owner>
+    """
+
+    dependencies = [
+        ('habits', '0012_habit_task'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                UPDATE habits_habit AS habit
+                SET task_id = task.id
+                FROM django_celery_beat_periodictask AS task
+                WHERE task.task = 'habits.tasks.send_habit_raminder'
+                  AND task.name = 'task_raminder_' || habit.id
+                                  || '/U-' || habit.owner_id
+                  AND habit.task_id IS NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Уникальность кронтабов, без нее параллельное создание
+    привычек плодит дубликаты, а get() падает с MultipleObjectsReturned.
+    Дубликаты сливаются в кронтаб с наименьшим id
+    """
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('habits', '0013_backfill_habit_task'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE TEMPORARY TABLE habits_crontab_duplicate AS
+                SELECT id, keep_id
+                FROM (
+                    SELECT id,
+                           MIN(id) OVER (
+                               PARTITION BY minute, hour, day_of_week,
+                                            day_of_month, month_of_year,
+                                            timezone
+                           ) AS keep_id
+                    FROM django_celery_beat_crontabschedule
+                ) AS ranked
+                WHERE id <> keep_id
+                """,
+                """
+                UPDATE habits_habit AS habit
+                SET time_to_do_id = duplicate.keep_id
+                FROM habits_crontab_duplicate AS duplicate
+                WHERE habit.time_to_do_id = duplicate.id
+                """,
+                """
+                UPDATE habits_habit AS habit
+                SET periodic_id = duplicate.keep_id
+                FROM habits_crontab_duplicate AS duplicate
+                WHERE habit.periodic_id = duplicate.id
+                """,
+                """
+                UPDATE django_celery_beat_periodictask AS task
+                SET crontab_id = duplicate.keep_id
+                FROM habits_crontab_duplicate AS duplicate
+                WHERE task.crontab_id = duplicate.id
+                """,
+                """
+                DELETE FROM django_celery_beat_crontabschedule
+                WHERE id IN (SELECT id FROM habits_crontab_duplicate)
+                """,
+                'DROP TABLE habits_crontab_duplicate',
+                # Проверка отложенных внешних ключей до создания индекса
+                'SET CONSTRAINTS ALL IMMEDIATE',
+                """
+                CREATE UNIQUE INDEX habits_crontabschedule_unique
+                ON django_celery_beat_crontabschedule (
+                    minute, hour, day_of_week,
+                    day_of_month, month_of_year, timezone
+                )
+                """,
+            ],
+            reverse_sql='DROP INDEX IF EXISTS habits_crontabschedule_unique',
+        ),
+    ]
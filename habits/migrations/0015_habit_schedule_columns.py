@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('habits', '0014_crontabschedule_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='habit',
+            options={'ordering': ['minute_of_day', 'id'], 'verbose_name': 'Habit', 'verbose_name_plural': 'Habits'},
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='minute_of_day',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text='Время выполнения привычки в минутах от начала дня, копия time_to_do для сортировки без обращения к кронтабу', null=True, verbose_name='минута дня'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='period_count',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text='Количество единиц периодичности, копия periodic', null=True, verbose_name='число единиц периодичности'),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='period_unit',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'минуты'), (2, 'часы'), (3, 'дни')], editable=False, help_text='Единица периодичности, копия periodic', null=True, verbose_name='единица периодичности'),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['owner', 'minute_of_day'], name='habits_owner_minute_idx'),
+        ),
+    ]
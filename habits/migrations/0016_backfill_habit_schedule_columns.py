@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Заполнение числовых полей расписания из кронтабов,
+    периодичность разбирается так же как в Habit.fill_schedule
+    """
+
+    dependencies = [
+        ('habits', '0015_habit_schedule_columns'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=r"""
+                UPDATE habits_habit AS habit
+                SET minute_of_day = time_to_do.hour::integer * 60
+                                    + time_to_do.minute::integer,
+                    period_unit = CASE
+                        WHEN periodic.minute = '*'
+                             AND periodic.hour = '*' THEN 3
+                        WHEN periodic.minute = '*'
+                             AND periodic.day_of_month = '*' THEN 2
+                        WHEN periodic.hour = '*'
+                             AND periodic.day_of_month = '*' THEN 1
+                    END,
+                    period_count = CASE
+                        WHEN periodic.minute = '*'
+                             AND periodic.hour = '*'
+                        THEN substring(periodic.day_of_month
+                                       FROM '(\d+)$')::integer
+                        WHEN periodic.minute = '*'
+                             AND periodic.day_of_month = '*'
+                        THEN substring(periodic.hour
+                                       FROM '(\d+)$')::integer
+                        WHEN periodic.hour = '*'
+                             AND periodic.day_of_month = '*'
+                        THEN substring(periodic.minute
+                                       FROM '(\d+)$')::integer
+                    END
+                FROM django_celery_beat_crontabschedule AS time_to_do,
+                     django_celery_beat_crontabschedule AS periodic
+                WHERE time_to_do.id = habit.time_to_do_id
+                  AND periodic.id = habit.periodic_id
+                  AND time_to_do.hour ~ '^\d+$'
+                  AND time_to_do.minute ~ '^\d+$'
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
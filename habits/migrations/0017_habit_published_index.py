@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0016_backfill_habit_schedule_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['minute_of_day', 'id'], name='habits_published_minute_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0017_habit_published_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='habit',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('action', 'place', config='russian'), condition=models.Q(('is_published', True)), name='habits_published_search_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = {
+    'habits_published_action_trgm_idx': 'action',
+    'habits_published_place_trgm_idx': 'place',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Индексы похожести создаются только если сервер
+    поддерживает расширение pg_trgm, иначе поиск
+    работает только по полнотекстовому индексу
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'",
+            )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    table = schema_editor.quote_name(
+        apps.get_model('habits', 'Habit')._meta.db_table,
+        )
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {schema_editor.quote_name(name)} '
+            f'ON {table} USING gin ({schema_editor.quote_name(column)} '
+            'gin_trgm_ops) WHERE is_published',
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}',
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habits', '0018_habit_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,91 @@
+import hashlib
+from typing import Tuple, Union
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from django.utils.http import parse_etags, quote_etag
+
+from habits.serializers import HabitRetieveFastSearilizer
+
+
+class ETagMixin:
+    """Условные GET запросы по ETag
+
+    ETag строится из версии данных, которую возвращает
+    get_etag_version, пользователя, адреса и Accept запроса.
+    При совпадении с If-None-Match отдается 304 без выборки
+    и сериализации. Версия None отключает ETag для запроса
+    """
+
+    def get_etag_version(self, request) -> Union[str, int, None]:
+        return None
+
+    def get_etag(self, request) -> Union[str, None]:
+        version = self.get_etag_version(request)
+        if version is None:
+            return
+        source = '|'.join((str(version),
+                           str(request.user.pk),
+                           request.build_absolute_uri(),
+                           request.headers.get('Accept', ''),
+                           ))
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag and etag in parse_etags(
+                request.headers.get('If-None-Match', ''),
+                ):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag},
+                            )
+        response = super().get(request, *args, **kwargs)
+        if etag and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+
+class FastRepresentationMixin:
+    """Вывод привычек быстрым сериализатором
+
+    Список строится из строк values() без создания объектов
+    и полей DRF, serializer_class остается для схемы API.
+    Параметр fields сокращает вывод и выбираемые колонки
+    """
+    fast_serializer_class = HabitRetieveFastSearilizer
+    fields_query_param = 'fields'
+
+    def get_fields(self) -> Tuple[str, ...]:
+        return self.fast_serializer_class.get_fields(
+            self.request.query_params.get(self.fields_query_param),
+            )
+
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset).only(
+            *self.fast_serializer_class.get_columns(self.get_fields()),
+            )
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        queryset = self.fast_serializer_class.get_rows(
+            self.filter_queryset(self.get_queryset()),
+            fields,
+            )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.fast_serializer_class.represent(page, fields),
+                )
+        return Response(
+            self.fast_serializer_class.represent(queryset, fields),
+            )
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        instance = self.get_object()
+        data, = self.fast_serializer_class.represent(
+            [self.fast_serializer_class.get_row(instance, fields)],
+            fields,
+            )
+        return Response(data)
@@ -1,11 +1,20 @@
 from django.db import models
-from django.db.models.functions import Cast
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 
-from django_celery_beat.models import CrontabSchedule
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+
+class PeriodUnit(models.IntegerChoices):
+    """Единица периодичности привычки
+    """
+    MINUTES = 1, 'минуты'
+    HOURS = 2, 'часы'
+    DAYS = 3, 'дни'
 
 
 class Habit(models.Model):
@@ -100,15 +109,110 @@ class Habit(models.Model):
                               default=settings.TELEGRAM_BOT_URL,
                               )
 
+    task = models.OneToOneField(PeriodicTask,
+                                verbose_name='задача напоминания',
+                                help_text='Периодическая задача '
+                                'отправки напоминаний привычки',
+                                on_delete=models.SET_NULL,
+                                related_name='habit',
+                                blank=True,
+                                null=True,
+                                editable=False,
+                                )
+
+    next_reminder_at = models.DateTimeField(verbose_name='следующее '
+                                            'напоминание',
+                                            help_text='Время следующей '
+                                            'отправки напоминания, '
+                                            'используется диспетчером '
+                                            'напоминаний',
+                                            blank=True,
+                                            null=True,
+                                            editable=False,
+                                            db_index=True,
+                                            )
+
+    minute_of_day = models.PositiveSmallIntegerField(
+        verbose_name='минута дня',
+        help_text='Время выполнения привычки в минутах от начала дня, '
+        'копия time_to_do для сортировки без обращения к кронтабу',
+        blank=True,
+        null=True,
+        editable=False,
+        )
+
+    period_unit = models.PositiveSmallIntegerField(
+        verbose_name='единица периодичности',
+        help_text='Единица периодичности, копия periodic',
+        choices=PeriodUnit.choices,
+        blank=True,
+        null=True,
+        editable=False,
+        )
+
+    period_count = models.PositiveSmallIntegerField(
+        verbose_name='число единиц периодичности',
+        help_text='Количество единиц периодичности, копия periodic',
+        blank=True,
+        null=True,
+        editable=False,
+        )
+
     class Meta:
         verbose_name = _("Habit")
         verbose_name_plural = _("Habits")
-        ordering = [
-            Cast('time_to_do__hour', output_field=models.IntegerField()),
+        ordering = ['minute_of_day', 'id']
+        indexes = [
+            models.Index(fields=['owner', 'minute_of_day'],
+                         name='habits_owner_minute_idx',
+                         ),
+            models.Index(fields=['minute_of_day', 'id'],
+                         name='habits_published_minute_idx',
+                         condition=models.Q(is_published=True),
+                         ),
+            GinIndex(SearchVector('action', 'place', config='russian'),
+                     name='habits_published_search_idx',
+                     condition=models.Q(is_published=True),
+                     ),
             ]
 
     def __str__(self):
         return f'{self.action}: {self.time_to_do}'
 
+    def fill_schedule(self) -> None:
+        """Заполнение числовых полей расписания из кронтабов
+        """
+        hour, minute = str(self.time_to_do.hour), str(self.time_to_do.minute)
+        self.minute_of_day = (int(hour) * 60 + int(minute)
+                              if hour.isdigit() and minute.isdigit()
+                              else None)
+        self.period_unit, self.period_count = None, None
+        match (self.periodic.minute,
+               self.periodic.hour,
+               self.periodic.day_of_month):
+            case '*', '*', value:
+                self.period_unit = PeriodUnit.DAYS
+            case '*', value, '*':
+                self.period_unit = PeriodUnit.HOURS
+            case value, '*', '*':
+                self.period_unit = PeriodUnit.MINUTES
+            case _:
+                return
+        count = str(value).split('/')[-1]
+        self.period_count = int(count) if count.isdigit() else None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.fill_schedule()
+        elif {'time_to_do', 'periodic'} & set(update_fields):
+            self.fill_schedule()
+            kwargs['update_fields'] = {*update_fields,
+                                       'minute_of_day',
+                                       'period_unit',
+                                       'period_count',
+                                       }
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("habits:habit_detail", kwargs={"pk": self.pk})
@@ -1,9 +1,206 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from urllib.parse import parse_qs, urlencode
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from django.db.models import Q
+
+
+class KeysetPaginateHabits(BasePagination):
+    """Пагинация привычек по курсору
+
+    Страница выбирается условием по (minute_of_day, id) и индексу,
+    без COUNT и OFFSET, поэтому глубокие страницы не дороже первых.
+    Привычки без времени идут последними, как в сортировке PostgreSQL
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 15
+    cursor_query_param = 'cursor'
+    position_field = 'minute_of_day'
+    ordering = ('minute_of_day', 'id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def parse_position(self, value: str):
+        """Значение поля позиции из курсора
+        """
+        return int(value) if value else None
+
+    def decode_cursor(self, request):
+        """Разбор курсора на позицию и направление
+
+        Returns:
+            Tuple: (значение position_field, id, reverse)
+            или None для первой страницы
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return
+        try:
+            query = parse_qs(b64decode(encoded.encode()).decode(),
+                             keep_blank_values=True,
+                             )
+            return (self.parse_position(query['m'][0]),
+                    int(query['i'][0]),
+                    query.get('r', ['0'])[0] == '1',
+                    )
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, habit, reverse: bool) -> str:
+        """Ссылка на страницу после или перед привычкой,
+        привычка может быть объектом или строкой values()
+        """
+        if isinstance(habit, dict):
+            position, pk = habit[self.position_field], habit['id']
+        else:
+            position, pk = getattr(habit, self.position_field), habit.pk
+        query = {'m': '' if position is None else position, 'i': pk}
+        if reverse:
+            query['r'] = 1
+        cursor = b64encode(urlencode(query).encode()).decode()
+        return replace_query_param(self.base_url,
+                                   self.cursor_query_param,
+                                   cursor,
+                                   )
+
+    def _after(self, minute, pk) -> Q:
+        """Привычки после позиции в порядке сортировки
+        """
+        if minute is None:
+            return Q(minute_of_day__isnull=True, id__gt=pk)
+        return (Q(minute_of_day__gt=minute)
+                | Q(minute_of_day=minute, id__gt=pk)
+                | Q(minute_of_day__isnull=True))
+
+    def _before(self, minute, pk) -> Q:
+        """Привычки до позиции в порядке сортировки
+        """
+        if minute is None:
+            return (Q(minute_of_day__isnull=False)
+                    | Q(minute_of_day__isnull=True, id__lt=pk))
+        return (Q(minute_of_day__lt=minute)
+                | Q(minute_of_day=minute, id__lt=pk))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            position, reverse = None, False
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            value, pk, reverse = cursor
+            position = (value, pk)
+            if reverse:
+                queryset = queryset.filter(
+                    self._before(value, pk),
+                    ).order_by(*(field[1:] if field.startswith('-')
+                                 else f'-{field}'
+                                 for field in self.ordering))
+            else:
+                queryset = queryset.filter(
+                    self._after(value, pk),
+                    ).order_by(*self.ordering)
+
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+
+        self.next = self.previous = None
+        if page:
+            if has_more or reverse:
+                self.next = self.encode_cursor(page[-1], reverse=False)
+            if (has_more and reverse) or (position and not reverse):
+                self.previous = self.encode_cursor(page[0], reverse=True)
+        elif position:
+            # Пустая страница, ссылки строятся от позиции курсора
+            habit = {self.position_field: position[0], 'id': position[1]}
+            if reverse:
+                self.next = self.encode_cursor(habit, reverse=False)
+            else:
+                self.previous = self.encode_cursor(habit, reverse=True)
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True,
+                             'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetRankPaginateHabits(KeysetPaginateHabits):
+    """Пагинация результатов поиска по курсору
+
+    Привычки идут по убыванию ранга поиска из аннотации rank
+    """
+    position_field = 'rank'
+    ordering = ('-rank', 'id')
+
+    def parse_position(self, value: str) -> float:
+        return float(value)
+
+    def _after(self, rank, pk) -> Q:
+        return Q(rank__lt=rank) | Q(rank=rank, id__gt=pk)
+
+    def _before(self, rank, pk) -> Q:
+        return Q(rank__gt=rank) | Q(rank=rank, id__lt=pk)
 
 
 class PaginateHabits(PageNumberPagination):
     """Постраничная пагинация привычек
+
+    С параметром cursor, в том числе пустым для первой страницы,
+    переключается на пагинацию по курсору, результаты поиска
+    с аннотацией rank листаются по рангу
     """
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 15
+    cursor_class = KeysetPaginateHabits
+    rank_cursor_class = KeysetRankPaginateHabits
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.cursor_class.cursor_query_param in request.query_params:
+            self.cursor = (
+                self.rank_cursor_class()
+                if 'rank' in queryset.query.annotation_select
+                else self.cursor_class()
+                )
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
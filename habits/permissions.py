@@ -4,19 +4,20 @@ from rest_framework import status
 
 class IsCurrentUser(BasePermission):
     """Права доступа только для текущего пользователя
+
+    Проверяется на объекте уже загруженном get_object,
+    владелец сравнивается по owner_id без загрузки пользователя
     """
     message = {
         'published': 'Данную привычку может просматривать только владелец',
         }
     code = status.HTTP_403_FORBIDDEN
 
-    def has_permission(self, request, view):
-        pk = view.kwargs['pk']
-        instance = view.queryset.get(pk=pk)
-        return request.user == instance.owner
+    def has_object_permission(self, request, view, obj):
+        return obj.owner_id == request.user.pk
 
 
-class IsAdmin(BaseException):
+class IsAdmin(BasePermission):
     """Класс доступа администратора
     """
     message = {
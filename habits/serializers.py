@@ -1,6 +1,12 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Tuple, Union
+
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 
 from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.duration import duration_string
 
 from habits.models import Habit
 from habits.validators import (ValidateInterval,
@@ -12,7 +18,12 @@ from habits.validators import (ValidateInterval,
                                ValidatorRelatedHabitSomePublished,
                                )
 from habits.handlers import HandleInterval, HandleTimeToDo, HandleTimeToDone
-from habits.services import create_periodic_task, update_periodic_task
+from habits.services import (create_periodic_task,
+                             invalidate_reminders,
+                             invalidate_habit_lists,
+                             publish_habit_chain,
+                             update_periodic_task,
+                             )
 from habits.telegram_bot.utils import construct_periodic
 
 
@@ -80,11 +91,9 @@ class HabitCreateSearilizer(serializers.ModelSerializer):
                 )
         return validated_data
 
-    def create(self, validated_data):
-        validated_data = self._handle_times(validated_data)
-        instance = super().create(validated_data)
-        user = self.context['request'].user
-        create_periodic_task(user, instance, validated_data)
+    def construct_result(self, validated_data: dict) -> dict:
+        """Вывод расписания созданной привычки в читаемом виде
+        """
         min_ = validated_data["periodic"].minute
         hour = validated_data["periodic"].hour
         day_of_month = validated_data["periodic"].day_of_month
@@ -94,41 +103,66 @@ class HabitCreateSearilizer(serializers.ModelSerializer):
         validated_data['time_to_do'] = f'{t_to_do.hour}:{t_to_do.minute}'
         return validated_data
 
+    def create(self, validated_data):
+        validated_data = self._handle_times(validated_data)
+        instance = super().create(validated_data)
+        user = self.context['request'].user
+        create_periodic_task(user, instance, validated_data)
+        invalidate_habit_lists(instance.owner_id, instance.is_published)
+        return self.construct_result(validated_data)
+
     def update(self, instance, validated_data):
         is_published_changed = validated_data.get('is_published')
+        # Публичная лента меняется если привычка была или стала
+        # публичной, либо сменилась публичность цепочки
+        published = (instance.is_published
+                     or is_published_changed is not None)
         validated_data = self._handle_times(validated_data)
         with transaction.atomic():
             instance = super().update(instance, validated_data)
             update_periodic_task(instance, validated_data)
+            invalidate_reminders(instance)
+            invalidate_habit_lists(instance.owner_id, published)
             if is_published_changed is not None:
-                related_habit = instance.related_habit
-                if related_habit:
-                    related_habit.is_published = is_published_changed
-                    related_habit.save(
-                        update_fields=('is_published',),
-                        )
-                    ralated_habit = Habit.objects.filter(
-                        related_habit=related_habit,
-                        )
-                    ralated_habit.update(
-                        is_published=is_published_changed,
-                        )
-                else:
-                    try:
-                        ralated_habit = Habit.objects.filter(
-                            related_habit=instance,
-                            )
-                        ralated_habit.update(
-                            is_published=is_published_changed,
-                            )
-                        ralated_habit.related_habit.update(
-                            is_published=is_published_changed,
-                            )
-                    except AttributeError:
-                        pass
+                publish_habit_chain(instance, is_published_changed)
         return instance
 
 
+class PrefetchedHabitField(serializers.PrimaryKeyRelatedField):
+    """Связанная привычка из заранее загруженных привычек пользователя
+
+    Привычки берутся из context['related_habits'],
+    поэтому проверка пачки не делает запрос на каждый элемент
+    """
+    default_error_messages = {
+        'not_owner': 'Связаная привычка может быть только ваша',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        habit = self.context['related_habits'].get(pk)
+        if habit is None:
+            self.fail('not_owner')
+        return habit
+
+
+class HabitBulkCreateSearilizer(HabitCreateSearilizer):
+    """Сериализатор элемента пачки привычек
+
+    Проверяет привычку теми же валидаторами что и при создании одной,
+    сохранение выполняет bulk_create_habits
+    """
+    related_habit = PrefetchedHabitField(queryset=Habit.objects.all(),
+                                         required=False,
+                                         allow_null=True,
+                                         )
+
+
 class HabitRelatedRetieveSearilizer(serializers.ModelSerializer):
     """Сеарилизатор вывода связанной привычки
     """
@@ -170,3 +204,142 @@ class HabitRetieveSearilizer(serializers.ModelSerializer):
                   'is_published',
                   'url_bot',
                   )
+
+
+class HabitRetieveFastSearilizer:
+    """Быстрый вывод привычек без полей DRF
+
+    Строит тот же JSON что HabitRetieveSearilizer из строк values(),
+    связанные привычки всей страницы загружаются одним запросом.
+    Набор полей можно сократить, тогда сокращается и выборка
+    """
+    # Поле вывода и колонка строки, related_habit выводится списком
+    # связанных привычек и собственной колонки не требует
+    fields = {'pk': 'id',
+              'place': 'place',
+              'time_to_do': 'time_to_do_id',
+              'action': 'action',
+              'is_nice_habit': 'is_nice_habit',
+              'related_habit': None,
+              'periodic': 'periodic_id',
+              'reward': 'reward',
+              'time_to_done': 'time_to_done',
+              'is_published': 'is_published',
+              'url_bot': 'url_bot',
+              }
+    # Колонки нужные всегда: для связанных привычек,
+    # проверки владельца и курсора пагинации
+    required_columns = ('id', 'owner_id', 'minute_of_day')
+    related_columns = ('id',
+                       'place',
+                       'time_to_do_id',
+                       'action',
+                       'is_nice_habit',
+                       'related_habit_id',
+                       'periodic_id',
+                       'reward',
+                       'time_to_done',
+                       'is_published',
+                       'url_bot',
+                       )
+
+    @classmethod
+    def get_fields(cls, value: Union[str, None]) -> Tuple[str, ...]:
+        """Поля вывода из параметра fields в порядке сериализатора
+        """
+        if not value:
+            return tuple(cls.fields)
+        requested = {field.strip() for field in value.split(',')} - {''}
+        unknown = requested - cls.fields.keys()
+        if unknown:
+            raise ValidationError({
+                'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}',
+                })
+        return tuple(field for field in cls.fields if field in requested)
+
+    @classmethod
+    def get_columns(cls, fields: Iterable[str]) -> Tuple[str, ...]:
+        """Колонки выборки для полей вывода
+        """
+        columns = list(cls.required_columns)
+        for field in fields:
+            column = cls.fields[field]
+            if column is not None and column not in columns:
+                columns.append(column)
+        return tuple(columns)
+
+    @classmethod
+    def get_rows(cls, queryset: QuerySet, fields: Iterable[str] = None,
+                 ) -> QuerySet:
+        """Строки привычек для вывода, сортировка queryset
+        и его аннотации, например ранг поиска, сохраняются
+        """
+        return queryset.values(*cls.get_columns(fields or cls.fields),
+                               *queryset.query.annotation_select,
+                               )
+
+    @classmethod
+    def get_row(cls, instance: Habit, fields: Iterable[str] = None) -> dict:
+        """Строка из уже загруженной привычки
+        """
+        return {column: getattr(instance, column)
+                for column in cls.get_columns(fields or cls.fields)}
+
+    @classmethod
+    def represent_related(cls, row: Mapping) -> dict:
+        """Вывод связанной привычки как HabitRelatedRetieveSearilizer
+        """
+        return {
+            'pk': row['id'],
+            'place': row['place'],
+            'time_to_do': row['time_to_do_id'],
+            'action': row['action'],
+            'is_nice_habit': row['is_nice_habit'],
+            'related_habit': row['related_habit_id'],
+            'periodic': row['periodic_id'],
+            'reward': row['reward'],
+            'time_to_done': duration_string(row['time_to_done']),
+            'is_published': row['is_published'],
+            'url_bot': row['url_bot'],
+            }
+
+    @classmethod
+    def get_related(cls, ids_habits: Iterable[int],
+                    ) -> Dict[int, List[dict]]:
+        """Связанные привычки по id привычки, на которую они ссылаются
+        """
+        related = defaultdict(list)
+        rows = Habit.objects.filter(
+            related_habit_id__in=ids_habits,
+            ).values(*cls.related_columns)
+        for row in rows:
+            related[row['related_habit_id']].append(
+                cls.represent_related(row),
+                )
+        return related
+
+    @classmethod
+    def represent(cls, rows: Iterable[Mapping],
+                  fields: Iterable[str] = None,
+                  ) -> List[dict]:
+        """Вывод привычек со связанными привычками,
+        без related_habit в полях связанные не загружаются
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        fields = tuple(fields or cls.fields)
+        related = (cls.get_related([row['id'] for row in rows])
+                   if 'related_habit' in fields else {})
+        result = []
+        for row in rows:
+            data = {}
+            for field in fields:
+                if field == 'related_habit':
+                    data[field] = related.get(row['id'], [])
+                elif field == 'time_to_done':
+                    data[field] = duration_string(row['time_to_done'])
+                else:
+                    data[field] = row[cls.fields[field]]
+            result.append(data)
+        return result
@@ -1,24 +1,79 @@
-import requests
+import csv
+import hashlib
+import io
 import json
-from datetime import datetime
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from gevent.pool import Pool
 
 from aiogram.utils.formatting import as_list, as_marked_section, Bold
 from aiogram.enums import ParseMode
 
-from django_celery_beat.models import CrontabSchedule, PeriodicTask
+from django_celery_beat.models import (CrontabSchedule,
+                                       PeriodicTask,
+                                       PeriodicTasks,
+                                       )
 from django.utils import timezone
+from django.utils.duration import duration_string
+from django.db import connection, transaction
+from django.db.models import Model, QuerySet
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
 
-from config.utils import find_env
+from habits.delivery import (DeliveryError,
+                             DeliveryRetry,
+                             get_delivery_client,
+                             )
+from habits.cache import bump_versions_on_commit, get_version, get_versions
 from habits.models import Habit
-from habits.telegram_bot.utils import construct_periodic
-from habits.handlers import HandleCronScheduleToTask
+from habits.telegram_bot.utils import construct_periodic, construct_schedule
+from habits.handlers import (CrontabKey,
+                             HandleCronScheduleToTask,
+                             HandleCrontab,
+                             HandleInterval,
+                             HandleTimeToDo,
+                             HandleTimeToDone,
+                             )
+
 
+# Ключи кронтабов времени, интервала и задачи привычки
+HabitKeys = Tuple[tuple, tuple, Union[tuple, None]]
 
 PATH_REMINDER_TASK = 'habits.tasks.send_habit_raminder'
-TELEGRAM_SEND_MESSAGE_URL = f'https://api.telegram.org/bot{find_env("TELEGRAM_API_KEY")}/sendMessage'
+REMINDER_SCHEDULE_FIELDS = ('time_to_do__minute',
+                            'time_to_do__hour',
+                            'periodic__minute',
+                            'periodic__hour',
+                            'periodic__day_of_month',
+                            )
+REMINDER_LOOKAHEAD_DAYS = 366
+REMINDER_RELATED_FIELDS = ('periodic', 'related_habit__periodic')
+REMINDER_TIME_PLACEHOLDER = '\x1etime\x1e'
+REMINDER_VERSION_KEY = 'habits:reminder:version:{}'
+REMINDER_KEY = 'habits:reminder:{}:{}'
+HABITS_USER_VERSION_KEY = 'habits:user:version:{}'
+HABITS_PUBLIC_VERSION_KEY = 'habits:public:version'
+HABIT_OWNER_KEY = 'habits:owner:{}'
+HABITS_PRIVATE_LIST_KEY = 'habits:private:{}:{}:{}'
+HABITS_PUBLIC_LIST_KEY = 'habits:public:{}:{}'
+HABITS_EXPORT_FIELDS = ('pk',
+                        'place',
+                        'time_to_do',
+                        'action',
+                        'is_nice_habit',
+                        'related_habit',
+                        'periodic',
+                        'reward',
+                        'time_to_done',
+                        'is_published',
+                        'url_bot',
+                        )
+
+logger = logging.getLogger(__name__)
 
 
 def construct_time_to_task(time_interval: CrontabSchedule) -> datetime:
@@ -35,12 +90,133 @@ def construct_time_to_task(time_interval: CrontabSchedule) -> datetime:
     return result
 
 
+def construct_next_reminder(crontab: CrontabSchedule,
+                            after: datetime,
+                            ) -> datetime:
+    """Ближайшее время срабатывания кронтаба строго после указанного
+
+    Args:
+        crontab (CrontabSchedule): Кронтаб задачи, может быть не сохранен
+        after (datetime): Время после которого ищется срабатывание
+
+    Returns:
+        datetime: Время срабатывания в часовом поясе кронтаба
+    """
+    schedule = crontab.schedule
+    start = timezone.localtime(after, crontab.timezone).replace(
+        second=0,
+        microsecond=0,
+        ) + timedelta(minutes=1)
+    day = start.replace(hour=0, minute=0)
+    for _ in range(REMINDER_LOOKAHEAD_DAYS):
+        if (day.day in schedule.day_of_month and
+                day.month in schedule.month_of_year and
+                day.isoweekday() % 7 in schedule.day_of_week):
+            for hour in sorted(schedule.hour):
+                for minute in sorted(schedule.minute):
+                    candidate = day.replace(hour=hour, minute=minute)
+                    if candidate >= start:
+                        return candidate
+        day += timedelta(days=1)
+    raise ValueError(
+        f'{crontab} не срабатывает в ближайший год',
+        )
+
+
+def reschedule_reminders(rows: Iterable[tuple],
+                         after: datetime,
+                         ) -> int:
+    """Перенос напоминаний привычек на следующее срабатывание
+
+    Привычки группируются по расписанию, поэтому на каждую
+    группу приходится один UPDATE вне зависимости от числа привычек
+
+    Args:
+        rows (Iterable[tuple]): Кортежи (pk, *REMINDER_SCHEDULE_FIELDS)
+        after (datetime): Время после которого ищется срабатывание
+
+    Returns:
+        int: Количество перенесенных привычек
+    """
+    groups = defaultdict(list)
+    for pk, *schedule in rows:
+        groups[tuple(schedule)].append(pk)
+
+    count = 0
+    for schedule, pks in groups.items():
+        to_do_minute, to_do_hour, minute, hour, day_of_month = schedule
+        crontab = HandleCronScheduleToTask.construct_interval_to_task(
+            CrontabSchedule(minute=to_do_minute, hour=to_do_hour),
+            CrontabSchedule(minute=minute,
+                            hour=hour,
+                            day_of_month=day_of_month,
+                            ),
+            )
+        count += Habit.objects.filter(pk__in=pks).update(
+            next_reminder_at=construct_next_reminder(crontab, after),
+            )
+    return count
+
+
+def schedule_habit_reminder(instance: Habit,
+                            time_to_do: CrontabSchedule,
+                            periodic: CrontabSchedule,
+                            ) -> datetime:
+    """Назначение следующего напоминания привычки для диспетчера
+    """
+    crontab = HandleCronScheduleToTask.construct_interval_to_task(
+        time_to_do,
+        periodic,
+        )
+    instance.next_reminder_at = construct_next_reminder(
+        crontab,
+        timezone.now(),
+        )
+    instance.save(update_fields=('next_reminder_at',))
+    return instance.next_reminder_at
+
+
+def collect_due_reminders(now: Union[datetime, None] = None,
+                          ) -> List[Tuple[int, int]]:
+    """Выборка привычек, напоминания которых наступили
+
+    Выбранные привычки сразу переносятся на следующее срабатывание,
+    строки блокируются с SKIP LOCKED, поэтому параллельные
+    диспетчеры не отправят одно напоминание дважды
+
+    Returns:
+        List[Tuple[int, int]]: Пары (id привычки, id чата)
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            Habit.objects.select_for_update(
+                skip_locked=True,
+                of=('self',),
+                ).filter(
+                    next_reminder_at__lte=now,
+                    ).order_by().values_list(
+                        'pk',
+                        'owner__tg_id',
+                        *REMINDER_SCHEDULE_FIELDS,
+                        ),
+            )
+        reschedule_reminders(
+            ((pk, *schedule) for pk, _, *schedule in due),
+            now,
+            )
+    return [(pk, id_chat) for pk, id_chat, *_ in due if id_chat]
+
+
 def create_periodic_task(user: AbstractUser,
                          instance: Habit,
                          validated_data: dict,
-                         ) -> PeriodicTask:
+                         ) -> Union[PeriodicTask, None]:
     """Создание рассписания задач
 
+    В режиме диспетчера напоминаний задача не создается,
+    привычке назначается время следующего напоминания
+
     Args:
         user (AbstractUser): Модель пользователя
         instance (Habit): Успешно созданая модель привычки
@@ -49,6 +225,12 @@ def create_periodic_task(user: AbstractUser,
     Returns:
         PeriodicTask: Возвращает объект рассписания
     """
+    if settings.REMINDER_DISPATCHER:
+        schedule_habit_reminder(instance,
+                                validated_data['time_to_do'],
+                                validated_data['periodic'],
+                                )
+        return
     if not user.tg_id:
         time = construct_time_to_task(validated_data['time_to_do'])
         kwargs_to_task = json.dumps({'id_habit': instance.pk})
@@ -83,12 +265,256 @@ def create_periodic_task(user: AbstractUser,
             start_time=time,
             enabled=True,
             )
+    instance.task = task
+    instance.save(update_fields=('task',))
     return task
 
 
+def construct_habit_keys(items: Iterable[dict]) -> List[HabitKeys]:
+    """Ключи кронтабов времени, интервала и задачи каждой привычки
+
+    В режиме диспетчера задачи не создаются, ключ задачи None
+    """
+    keys = []
+    for data in items:
+        to_do = HandleTimeToDo.get_crontab_time_key(data['time_to_do'])
+        interval = HandleInterval.get_interval_key(data['periodic'])
+        task = (None if settings.REMINDER_DISPATCHER
+                else HandleCronScheduleToTask.get_interval_to_task_key(
+                    to_do,
+                    interval,
+                    ))
+        keys.append((to_do, interval, task))
+    return keys
+
+
+def resolve_habit_crontabs(keys: List[HabitKeys],
+                           crontabs: Dict[CrontabKey, CrontabSchedule],
+                           ) -> Dict[CrontabKey, CrontabSchedule]:
+    """Дополнение crontabs недостающими кронтабами через HandleCrontab
+    """
+    missing = {HandleCrontab.get_key(*key): key
+               for row in keys
+               for key in row
+               if key is not None}
+    missing = [key for str_key, key in missing.items()
+               if str_key not in crontabs]
+    if missing:
+        crontabs.update(HandleCrontab.resolve(missing))
+    return crontabs
+
+
+def construct_habits(items: List[Tuple[AbstractUser, dict]],
+                     keys: List[HabitKeys],
+                     crontabs: Dict[CrontabKey, CrontabSchedule],
+                     ids: Union[List[int], None] = None,
+                     ) -> List[Habit]:
+    """Привычки для вставки пачкой
+
+    Время и интервал в данных заменяются на кронтабы,
+    как это делает сериализатор при создании одной привычки.
+    В режиме диспетчера назначается время следующего напоминания
+    """
+    now = timezone.now()
+    habits = []
+    for index, ((user, data), (to_do, interval, _)) in enumerate(
+            zip(items, keys),
+            ):
+        data['time_to_do'] = crontabs[HandleCrontab.get_key(*to_do)]
+        data['periodic'] = crontabs[HandleCrontab.get_key(*interval)]
+        data['time_to_done'] = HandleTimeToDone.get_time(
+            data['time_to_done'],
+            )
+        habit = Habit(owner=user, **data)
+        if ids is not None:
+            habit.pk = ids[index]
+        habit.fill_schedule()
+        if settings.REMINDER_DISPATCHER:
+            habit.next_reminder_at = construct_next_reminder(
+                HandleCronScheduleToTask.construct_interval_to_task(
+                    data['time_to_do'],
+                    data['periodic'],
+                    ),
+                now,
+                )
+        habits.append(habit)
+    return habits
+
+
+def construct_tasks(habits: List[Habit],
+                    keys: List[HabitKeys],
+                    crontabs: Dict[CrontabKey, CrontabSchedule],
+                    ids: Union[List[int], None] = None,
+                    ) -> List[PeriodicTask]:
+    """Задачи напоминаний для вставки пачкой, привычкам
+    назначаются их задачи
+
+    Задачи владельцев без id чата выключены до привязки Telegram
+    """
+    tasks = []
+    for index, (habit, (_, _, task_key)) in enumerate(zip(habits, keys)):
+        owner = habit.owner
+        kwargs_to_task = {'id_habit': habit.pk}
+        if owner.tg_id:
+            kwargs_to_task['id_chat'] = owner.tg_id
+        task = PeriodicTask(
+            name=f'task_raminder_{habit.pk}/U-{owner.pk}',
+            task=PATH_REMINDER_TASK,
+            crontab=crontabs[HandleCrontab.get_key(*task_key)],
+            kwargs=json.dumps(kwargs_to_task),
+            expire_seconds=settings.EXPIRE_SECONDS_TASK,
+            start_time=construct_time_to_task(habit.time_to_do),
+            enabled=bool(owner.tg_id),
+            )
+        if ids is not None:
+            task.pk = ids[index]
+        tasks.append(task)
+    return tasks
+
+
+def bulk_create_habits(user: AbstractUser,
+                       items: List[dict],
+                       ) -> List[Habit]:
+    """Создание пачки привычек с расписаниями
+
+    Кронтабы всех привычек получаются вместе, привычки
+    и их задачи создаются через bulk_create в одной транзакции
+
+    Args:
+        user (AbstractUser): Владелец привычек
+        items (List[dict]): Валидные данные привычек
+
+    Returns:
+        List[Habit]: Созданные привычки в порядке items
+    """
+    keys = construct_habit_keys(items)
+    with transaction.atomic():
+        crontabs = resolve_habit_crontabs(keys, {})
+        habits = construct_habits([(user, data) for data in items],
+                                  keys,
+                                  crontabs,
+                                  )
+        Habit.objects.bulk_create(habits)
+        if settings.REMINDER_DISPATCHER:
+            return habits
+
+        tasks = construct_tasks(habits, keys, crontabs)
+        PeriodicTask.objects.bulk_create(tasks)
+        for habit, task in zip(habits, tasks):
+            habit.task = task
+        Habit.objects.bulk_update(habits, ('task',))
+        # bulk_create не отправляет сигналы, beat узнает
+        # об изменении расписания по отметке PeriodicTasks
+        PeriodicTasks.update_changed()
+    return habits
+
+
+def reserve_ids(model: type, count: int) -> List[int]:
+    """Получение id из последовательности таблицы без вставки строк
+    """
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+            'FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+            )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def _construct_copy_value(value) -> str:
+    """Значение в текстовом формате COPY
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, timedelta):
+        return f'{value.total_seconds()} seconds'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\')
+                      .replace('\t', '\\t')
+                      .replace('\n', '\\n')
+                      .replace('\r', '\\r'))
+
+
+def copy_insert(instances: List[Model]) -> None:
+    """Вставка объектов одной модели через COPY
+
+    Сигналы и save() не вызываются, id объектов
+    должны быть назначены заранее, например reserve_ids
+    """
+    if not instances:
+        return
+    meta = instances[0]._meta
+    fields = meta.concrete_fields
+    buffer = io.StringIO()
+    for instance in instances:
+        buffer.write('\t'.join(
+            _construct_copy_value(field.get_db_prep_save(
+                field.pre_save(instance, add=True),
+                connection,
+                ))
+            for field in fields
+            ))
+        buffer.write('\n')
+    buffer.seek(0)
+    columns = ', '.join(connection.ops.quote_name(field.column)
+                        for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(meta.db_table)} '
+            f'({columns}) FROM STDIN',
+            buffer,
+            )
+
+
+def copy_create_habits(items: List[Tuple[AbstractUser, dict]],
+                       crontabs: Dict[CrontabKey, CrontabSchedule],
+                       ) -> List[Habit]:
+    """Загрузка пачки привычек разных владельцев через COPY
+
+    То же что bulk_create_habits, но привычки и их задачи
+    вставляются COPY с заранее полученными id. Кронтабы берутся
+    из crontabs, недостающие получаются вместе
+    и добавляются в crontabs для следующих пачек
+
+    Args:
+        items (List[Tuple[AbstractUser, dict]]): Владельцы
+        и валидные данные привычек
+        crontabs (Dict[CrontabKey, CrontabSchedule]): Известные кронтабы
+
+    Returns:
+        List[Habit]: Созданные привычки в порядке items
+    """
+    keys = construct_habit_keys(data for _, data in items)
+    with transaction.atomic():
+        resolve_habit_crontabs(keys, crontabs)
+        habits = construct_habits(items, keys, crontabs,
+                                  reserve_ids(Habit, len(items)),
+                                  )
+        if settings.REMINDER_DISPATCHER:
+            copy_insert(habits)
+            return habits
+
+        tasks = construct_tasks(habits, keys, crontabs,
+                                reserve_ids(PeriodicTask, len(habits)),
+                                )
+        for habit, task in zip(habits, tasks):
+            habit.task = task
+        copy_insert(tasks)
+        copy_insert(habits)
+        # COPY не отправляет сигналы, beat узнает
+        # об изменении расписания по отметке PeriodicTasks
+        PeriodicTasks.update_changed()
+    return habits
+
+
 def update_periodic_task(instance: Habit,
                          validated_data: dict,
-                         ) -> PeriodicTask:
+                         ) -> Union[PeriodicTask, None]:
     """Обновление рассписания задач
 
     Args:
@@ -98,13 +524,6 @@ def update_periodic_task(instance: Habit,
     Returns:
         PeriodicTask: Возвращает объект рассписания
     """
-    try:
-        task: PeriodicTask = PeriodicTask.objects.get(
-            name__contains=f'_{instance.pk}',
-            )
-    except ObjectDoesNotExist:
-        return
-
     time_to_do = validated_data.get(
         'time_to_do',
         ) if validated_data.get(
@@ -115,6 +534,15 @@ def update_periodic_task(instance: Habit,
         ) if validated_data.get(
             'periodic',
             ) else instance.periodic
+
+    if settings.REMINDER_DISPATCHER:
+        schedule_habit_reminder(instance, time_to_do, periodic)
+        return
+
+    if instance.task_id is None:
+        return
+    task: PeriodicTask = instance.task
+
     time = construct_time_to_task(time_to_do)
 
     cron = HandleCronScheduleToTask.get_interval_to_task(
@@ -131,41 +559,19 @@ def update_periodic_task(instance: Habit,
     return task
 
 
-def construct_message(id_habit: str, id_chat: str) -> None:
-    """Построение сообщения для напоминаний в Telegram
-    """
-    id_chat: int = int(id_chat)
-    id_habit: int = int(id_habit)
-
-    params: dict = {
-        'chat_id': id_chat,
-        'parse_mode': ParseMode.HTML
-    }
-
-    try:
-        habit = Habit.objects.get(pk=id_habit)
-    except ObjectDoesNotExist:
-        params.update(
-            {'text':
-                f'Привычка по ID {id_habit} не была найдена, '
-                'проверьте состав привычек'},
-            )
-        requests.request(
-            'POST',
-            TELEGRAM_SEND_MESSAGE_URL,
-            params=params,
-            )
-        raise UnboundLocalError(
-            f'{id_habit} Habit not found',
-            )
+def construct_reminder_text(habit: Habit,
+                            time_sft: str = REMINDER_TIME_PLACEHOLDER,
+                            ) -> str:
+    """Построение текста напоминания о привычке
 
+    Без указания времени строится шаблон, время
+    подставляется при отправке через fill_reminder_time
+    """
     period = construct_periodic(
         habit.periodic.minute,
         habit.periodic.hour,
         habit.periodic.day_of_month,
         )
-    current_time = settings.LOCAL_TIME_NOW
-    time_sft = current_time.strftime("%H:%M")
     if not habit.reward:
         related = habit.related_habit
         if related:
@@ -204,6 +610,355 @@ def construct_message(id_habit: str, id_chat: str) -> None:
         ),
         reward,
     )
+    return text.as_html()
+
+
+def fill_reminder_time(template: str) -> str:
+    """Подстановка текущего времени в шаблон напоминания
+    """
+    time_sft = timezone.localtime().strftime("%H:%M")
+    return template.replace(REMINDER_TIME_PLACEHOLDER, time_sft)
+
+
+def get_reminder_templates(ids_habits: Iterable[int],
+                           ) -> Dict[int, str]:
+    """Шаблоны напоминаний из кэша по id привычки и версии
+
+    Промахи загружаются одним запросом и кэшируются,
+    удаленных привычек в результате нет
+    """
+    ids_habits = set(ids_habits)
+    versions = get_versions(
+        REMINDER_VERSION_KEY.format(id_habit) for id_habit in ids_habits
+        )
+    keys = {
+        REMINDER_KEY.format(
+            id_habit,
+            versions[REMINDER_VERSION_KEY.format(id_habit)],
+            ): id_habit
+        for id_habit in ids_habits
+        }
+    cached = cache.get_many(keys)
+    templates = {keys[key]: template for key, template in cached.items()}
+
+    missing = ids_habits - templates.keys()
+    if missing:
+        habits = Habit.objects.select_related(
+            *REMINDER_RELATED_FIELDS,
+            ).in_bulk(missing)
+        rendered = {id_habit: construct_reminder_text(habit)
+                    for id_habit, habit in habits.items()}
+        cache.set_many(
+            {key: rendered[id_habit]
+             for key, id_habit in keys.items()
+             if id_habit in rendered},
+            timeout=settings.REMINDER_CACHE_TIMEOUT,
+            )
+        templates.update(rendered)
+    return templates
+
+
+def invalidate_reminders(instance: Habit, with_related: bool = True,
+                         ) -> None:
+    """Сброс шаблонов напоминаний привычки после фиксации транзакции
+
+    Шаблоны привычек ссылающихся на эту содержат ее описание
+    в награде, поэтому сбрасываются вместе с ней
+    """
+    ids_habits = [instance.pk]
+    if with_related:
+        ids_habits.extend(
+            Habit.objects.filter(
+                related_habit=instance,
+                ).values_list('pk', flat=True),
+            )
+    bump_versions_on_commit(
+        REMINDER_VERSION_KEY.format(id_habit) for id_habit in ids_habits
+        )
+
+
+def invalidate_habit_lists(owner_id: int, published: bool) -> None:
+    """Сброс версий списков привычек после фиксации транзакции
+
+    Публичная лента сбрасывается только при изменении
+    публичных привычек или их публичности
+
+    Args:
+        owner_id (int): Владелец измененных привычек
+        published (bool): Затронуты публичные привычки
+    """
+    keys = [HABITS_USER_VERSION_KEY.format(owner_id)]
+    if published:
+        keys.append(HABITS_PUBLIC_VERSION_KEY)
+    bump_versions_on_commit(keys)
+
+
+def construct_chain_cte(table: str) -> str:
+    """Рекурсивный CTE chain с id всех привычек цепочки
+
+    Цепочка обходится по related_habit в обе стороны от привычки
+    из первого параметра запроса. UNION отбрасывает уже пройденные
+    привычки, поэтому циклы не зацикливают обход
+    """
+    return ('WITH RECURSIVE chain(id) AS ('
+            'SELECT %s::bigint '
+            'UNION '
+            'SELECT CASE WHEN habit.id = chain.id '
+            'THEN habit.related_habit_id ELSE habit.id END '
+            f'FROM {table} habit '
+            'JOIN chain ON habit.related_habit_id = chain.id '
+            'OR (habit.id = chain.id '
+            'AND habit.related_habit_id IS NOT NULL)'
+            ') ')
+
+
+def publish_habit_chain(instance: Habit, is_published: bool) -> int:
+    """Изменение публичности всей цепочки связанных привычек
+
+    Обновление выполняется одним запросом
+    вне зависимости от длины цепочки
+
+    Args:
+        instance (Habit): Привычка из цепочки
+        is_published (bool): Новая публичность
+
+    Returns:
+        int: Количество измененных привычек
+    """
+    table = connection.ops.quote_name(Habit._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            construct_chain_cte(table)
+            + f'UPDATE {table} SET is_published = %s '
+            f'WHERE {table}.id IN (SELECT id FROM chain) '
+            f'AND {table}.is_published IS DISTINCT FROM %s '
+            'RETURNING owner_id',
+            [instance.pk, is_published, is_published],
+            )
+        rows = cursor.fetchall()
+    for owner_id in {owner_id for owner_id, in rows}:
+        invalidate_habit_lists(owner_id, True)
+    return len(rows)
+
+
+def get_habit_chain(id_habit: int, columns: Iterable[str]) -> List[dict]:
+    """Все привычки цепочки одним запросом
+
+    Args:
+        id_habit (int): Привычка из цепочки
+        columns (Iterable[str]): Колонки привычек
+
+    Returns:
+        List[dict]: Строки привычек в порядке сортировки модели,
+        пустой список если привычки нет
+    """
+    columns = tuple(columns)
+    table = connection.ops.quote_name(Habit._meta.db_table)
+    select = ', '.join(connection.ops.quote_name(column)
+                       for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            construct_chain_cte(table)
+            + f'SELECT {select} FROM {table} '
+            'WHERE id IN (SELECT id FROM chain) '
+            'ORDER BY minute_of_day, id',
+            [id_habit],
+            )
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def get_user_habits_version(owner_id: int) -> int:
+    """Версия привычек пользователя
+    """
+    return get_version(HABITS_USER_VERSION_KEY.format(owner_id))
+
+
+def get_public_habits_version() -> int:
+    """Версия публичных привычек
+    """
+    return get_version(HABITS_PUBLIC_VERSION_KEY)
+
+
+def remember_habit_owner(habit: Habit) -> None:
+    """Запоминание владельца привычки, владелец привычки не меняется,
+    поэтому запись делается только если ее еще нет
+    """
+    cache.add(HABIT_OWNER_KEY.format(habit.pk),
+              habit.owner_id,
+              timeout=settings.HABITS_LIST_CACHE_TIMEOUT,
+              )
+
+
+def get_habit_owner(id_habit: int) -> Union[int, None]:
+    """id владельца привычки из кэша без обращения к БД
+    """
+    return cache.get(HABIT_OWNER_KEY.format(id_habit))
+
+
+def construct_private_list_key(request) -> str:
+    """Ключ кэша списка личных привычек
+
+    Содержит версию привычек пользователя и хэш полного адреса,
+    от которого зависят страница и ссылки пагинации
+    """
+    version = get_user_habits_version(request.user.pk)
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return HABITS_PRIVATE_LIST_KEY.format(request.user.pk, version, url)
+
+
+def is_public_page_cached(request) -> bool:
+    """Кэшируются только первые страницы публичной ленты,
+    результаты поиска не кэшируются
+    """
+    params = request.query_params
+    if params.get('cursor') or params.get('search'):
+        return False
+    try:
+        page = int(params.get('page', 1))
+    except ValueError:
+        return False
+    return 0 < page <= settings.HABITS_PUBLIC_CACHED_PAGES
+
+
+def construct_public_list_key(request) -> str:
+    """Ключ кэша страницы публичной ленты, общий для всех пользователей
+    """
+    version = get_public_habits_version()
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return HABITS_PUBLIC_LIST_KEY.format(version, url)
+
+
+def iter_habits_export(queryset: QuerySet[Habit]) -> Iterator[dict]:
+    """Привычки для выгрузки с расписанием в читаемом виде
+
+    Привычки читаются курсором на сервере пачками
+    по HABITS_EXPORT_CHUNK_SIZE, весь список в память не загружается
+    """
+    habits = queryset.only(
+        'id',
+        'place',
+        'action',
+        'is_nice_habit',
+        'related_habit_id',
+        'reward',
+        'time_to_done',
+        'is_published',
+        'url_bot',
+        'minute_of_day',
+        'period_unit',
+        'period_count',
+        ).order_by('id').iterator(chunk_size=settings.HABITS_EXPORT_CHUNK_SIZE)
+    for habit in habits:
+        time, periodic = construct_schedule(habit)
+        yield {
+            'pk': habit.pk,
+            'place': habit.place,
+            'time_to_do': time,
+            'action': habit.action,
+            'is_nice_habit': habit.is_nice_habit,
+            'related_habit': habit.related_habit_id,
+            'periodic': periodic,
+            'reward': habit.reward,
+            'time_to_done': duration_string(habit.time_to_done),
+            'is_published': habit.is_published,
+            'url_bot': habit.url_bot,
+            }
+
+
+def stream_habits_ndjson(queryset: QuerySet[Habit]) -> Iterator[str]:
+    """Выгрузка привычек в NDJSON, по строке на привычку
+    """
+    for row in iter_habits_export(queryset):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _EchoBuffer:
+    """Буфер для csv.writer, возвращает записанную строку
+    """
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_habits_csv(queryset: QuerySet[Habit]) -> Iterator[str]:
+    """Выгрузка привычек в CSV с заголовком
+    """
+    writer = csv.DictWriter(_EchoBuffer(), fieldnames=HABITS_EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in iter_habits_export(queryset):
+        yield writer.writerow(row)
+
+
+def construct_not_found_text(id_habit: int) -> str:
+    """Текст напоминания об удаленной привычке
+    """
+    return (f'Привычка по ID {id_habit} не была найдена, '
+            'проверьте состав привычек')
+
+
+def construct_message(id_habit: str, id_chat: str) -> None:
+    """Построение сообщения для напоминаний в Telegram
+    """
+    id_chat: int = int(id_chat)
+    id_habit: int = int(id_habit)
+
+    client = get_delivery_client()
+
+    template = get_reminder_templates([id_habit]).get(id_habit)
+    if template is None:
+        client.send_message(
+            id_chat,
+            construct_not_found_text(id_habit),
+            )
+        raise UnboundLocalError(
+            f'{id_habit} Habit not found',
+            )
+
+    client.send_message(id_chat,
+                        fill_reminder_time(template),
+                        ParseMode.HTML,
+                        )
+
+
+def send_reminders(reminders: Iterable[Tuple[int, int]],
+                   ) -> List[Tuple[int, int, float]]:
+    """Отправка пачки напоминаний
+
+    Шаблоны берутся из кэша, промахи со связанными привычками
+    и кронтабами загружаются одним запросом, сообщения отправляются
+    параллельно через общий пул соединений клиента доставки
+
+    Args:
+        reminders (Iterable[Tuple[int, int]]): Пары (id привычки, id чата)
+
+    Returns:
+        List[Tuple[int, int, float]]: Напоминания которые нужно
+        повторить, с временем ожидания retry_after
+    """
+    reminders = [(int(id_habit), int(id_chat))
+                 for id_habit, id_chat in reminders]
+    templates = get_reminder_templates(
+        id_habit for id_habit, _ in reminders
+        )
+    client = get_delivery_client()
+
+    def send(reminder: Tuple[int, int],
+             ) -> Union[Tuple[int, int, float], None]:
+        id_habit, id_chat = reminder
+        template = templates.get(id_habit)
+        text = (fill_reminder_time(template)
+                if template else construct_not_found_text(id_habit))
+        try:
+            client.send_message(id_chat, text, ParseMode.HTML)
+        except DeliveryRetry as error:
+            return id_habit, id_chat, error.retry_after
+        except DeliveryError as error:
+            logger.warning('Напоминание %s в чат %s не доставлено: %s',
+                           id_habit,
+                           id_chat,
+                           error,
+                           )
 
-    params.update({'text': text.as_html()})
-    requests.request('POST', TELEGRAM_SEND_MESSAGE_URL, params=params)
+    pool = Pool(settings.REMINDER_SEND_CONCURRENCY)
+    return [retry
+            for retry in pool.imap_unordered(send, reminders)
+            if retry is not None]
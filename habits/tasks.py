@@ -1,9 +1,69 @@
+import logging
+
+from django.conf import settings
+
 from config.celery import app
-from habits.services import construct_message
+from habits.delivery import DeliveryRetry
+from habits.services import (construct_message,
+                             collect_due_reminders,
+                             send_reminders,
+                             )
+
+
+logger = logging.getLogger(__name__)
 
 
-@app.task
-def send_habit_raminder(id_habit: str, id_chat: str):
+@app.task(bind=True, max_retries=settings.TELEGRAM_MAX_RETRIES)
+def send_habit_raminder(self, id_habit: str, id_chat: str):
     """Точка отравки задачи для напоминания
+
+    При ограничении частоты или недоступности Telegram задача
+    откладывается на retry_after, воркер при этом не ждет
+    """
+    try:
+        construct_message(id_habit, id_chat)
+    except DeliveryRetry as error:
+        raise self.retry(exc=error, countdown=error.retry_after)
+
+
+@app.task(ignore_result=True)
+def send_habit_raminder_batch(reminders: list, attempt: int = 0) -> int:
+    """Отправка пачки напоминаний одной задачей
+
+    Args:
+        reminders (list): Пары (id привычки, id чата)
+        attempt (int): Номер повтора пачки
+
+    Напоминания упершиеся в ограничения Telegram
+    отправляются повторно одной отложенной пачкой,
+    не больше TELEGRAM_MAX_RETRIES раз
+    """
+    retries = send_reminders(reminders)
+    if retries and attempt >= settings.TELEGRAM_MAX_RETRIES:
+        logger.warning('Напоминания не доставлены после %s повторов: %s',
+                       attempt,
+                       [(id_habit, id_chat)
+                        for id_habit, id_chat, _ in retries],
+                       )
+    elif retries:
+        send_habit_raminder_batch.apply_async(
+            ([(id_habit, id_chat) for id_habit, id_chat, _ in retries],
+             attempt + 1,
+             ),
+            countdown=max(retry_after for *_, retry_after in retries),
+            )
+    return len(reminders) - len(retries)
+
+
+@app.task(ignore_result=True)
+def dispatch_habit_raminders() -> int:
+    """Диспетчер напоминаний, запускается каждую минуту
+
+    Выбирает привычки, время напоминания которых наступило,
+    и раздает их воркерам пачками
     """
-    construct_message(id_habit, id_chat)
+    reminders = collect_due_reminders()
+    size = settings.REMINDER_DISPATCH_BATCH_SIZE
+    for start in range(0, len(reminders), size):
+        send_habit_raminder_batch.delay(reminders[start:start + size])
+    return len(reminders)
@@ -8,10 +8,14 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 if not settings.configured:
     django.setup()
 
+from aiohttp import web
+
 from aiogram import Bot, Dispatcher, types
 
 from handlers.user_private import user_private_router
 from common_commands.bot_common_cmd import private
+from webhook import check_webhook_settings, create_webhook_app, set_webhook
+from db import close_pool
 
 from config.utils import find_env
 
@@ -23,12 +27,12 @@ bot = Bot(token=find_env('TELEGRAM_API_KEY'))
 dispatcher = Dispatcher()
 
 dispatcher.include_router(user_private_router)
+dispatcher.shutdown.register(close_pool)
 
 
-async def main():
-    await bot.delete_webhook(
-        drop_pending_updates=True,
-        )
+async def set_commands(bot: Bot) -> None:
+    """Команды бота в личных чатах
+    """
     await bot.delete_my_commands(
         scope=types.BotCommandScopeAllPrivateChats(),
         )
@@ -36,9 +40,43 @@ async def main():
         commands=private,
         scope=types.BotCommandScopeAllPrivateChats(),
         )
+
+
+async def on_webhook_startup(bot: Bot) -> None:
+    await set_webhook(bot, ALLOWED_UPDATES)
+    await set_commands(bot)
+
+
+async def main():
+    """Polling для локальной разработки
+
+    Webhook удаляется без сброса накопившихся обновлений,
+    они будут получены первым запросом
+    """
+    await bot.delete_webhook(
+        drop_pending_updates=False,
+        )
+    await set_commands(bot)
     await dispatcher.start_polling(
         bot,
         allowed_updates=ALLOWED_UPDATES,
         )
 
-asyncio.run(main())
+
+def run_webhook():
+    """Прием обновлений через webhook за nginx
+    """
+    check_webhook_settings()
+    dispatcher.startup.register(on_webhook_startup)
+    web.run_app(
+        create_webhook_app(dispatcher, bot),
+        host=settings.TELEGRAM_WEBHOOK_HOST,
+        port=settings.TELEGRAM_WEBHOOK_PORT,
+        )
+
+
+if __name__ == '__main__':
+    if settings.TELEGRAM_WEBHOOK_URL:
+        run_webhook()
+    else:
+        asyncio.run(main())
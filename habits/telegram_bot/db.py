@@ -0,0 +1,226 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, List, NamedTuple, Tuple, Union
+
+import asyncpg
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from habits.cache import MISSING
+from habits.models import Habit
+
+
+class HabitRecord(NamedTuple):
+    """Поля привычки для вывода в боте
+
+    Создание модели Habit на каждую строку занимает
+    больше времени чем сам запрос
+    """
+    is_nice_habit: bool
+    action: str
+    minute_of_day: Union[int, None]
+    period_unit: Union[int, None]
+    period_count: Union[int, None]
+
+
+HABIT_COLUMNS = HabitRecord._fields
+
+
+class UserCache:
+    """Кэш пользователей по id чата с временем жизни
+
+    Хранит и отсутствие пользователя, чтобы сообщения
+    неавторизованных чатов тоже не доходили до базы.
+    Бот работает в одном потоке цикла событий, блокировка не нужна
+    """
+    def __init__(self) -> None:
+        self._data = OrderedDict()
+
+    def get(self, tg_id: int) -> Any:
+        expires, record = self._data.get(tg_id, (0, MISSING))
+        if expires < time.monotonic():
+            return MISSING
+        return record
+
+    def set(self, tg_id: int, record: Union[asyncpg.Record, None]) -> None:
+        self._data[tg_id] = (
+            time.monotonic() + settings.TELEGRAM_USER_CACHE_TIMEOUT,
+            record,
+            )
+        self._data.move_to_end(tg_id)
+        while len(self._data) > settings.TELEGRAM_USER_CACHE_MAX_ENTRIES:
+            self._data.popitem(last=False)
+
+    def evict(self, user_id: int, tg_id: Union[int, None] = None) -> None:
+        """Сброс записей пользователя и его нового id чата
+        """
+        self._data.pop(tg_id, None)
+        for key, (_, record) in list(self._data.items()):
+            if record is not None and record['id'] == user_id:
+                del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+user_cache = UserCache()
+
+_pool = None
+_pool_loop = None
+_pool_lock = None
+_listener = None
+
+
+def _connect_kwargs() -> dict:
+    database = connections['default'].settings_dict
+    return {'host': database['HOST'] or None,
+            'port': database.get('PORT') or None,
+            'user': database['USER'],
+            'password': database['PASSWORD'] or None,
+            'database': database['NAME'],
+            }
+
+
+def _on_user_changed(connection: asyncpg.Connection,
+                     pid: int,
+                     channel: str,
+                     payload: str,
+                     ) -> None:
+    """Уведомление User.notify_bot, формат "id:id чата"
+    """
+    user_id, tg_id = payload.split(':')
+    user_cache.evict(int(user_id), int(tg_id) if tg_id else None)
+
+
+async def get_pool() -> asyncpg.Pool:
+    """Пул асинхронных соединений бота с PostgreSQL
+
+    Запросы бота идут через пул напрямую, а не через
+    sync_to_async ORM, который выполняет их по одному в потоке.
+    Пул создается при первом обращении в текущем цикле событий
+    вместе с отдельным соединением, слушающим изменения пользователей.
+    При переподключении этого соединения кэш пользователей сбрасывается
+    """
+    global _pool, _pool_loop, _pool_lock, _listener
+    loop = asyncio.get_running_loop()
+    if _pool_loop is not loop:
+        _pool, _pool_loop, _pool_lock, _listener = (None, loop,
+                                                    asyncio.Lock(), None)
+    if _pool is not None and _listener is not None\
+            and not _listener.is_closed():
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                **_connect_kwargs(),
+                min_size=settings.TELEGRAM_DB_POOL_MIN_SIZE,
+                max_size=settings.TELEGRAM_DB_POOL_MAX_SIZE,
+                )
+        if _listener is None or _listener.is_closed():
+            user_cache.clear()
+            _listener = await asyncpg.connect(**_connect_kwargs())
+            await _listener.add_listener(settings.TELEGRAM_USER_CHANNEL,
+                                         _on_user_changed,
+                                         )
+    return _pool
+
+
+async def close_pool() -> None:
+    """Закрытие пула при остановке бота
+    """
+    global _pool, _listener
+    if _listener is not None:
+        await _listener.close()
+    if _pool is not None:
+        await _pool.close()
+    _pool = _listener = None
+    user_cache.clear()
+
+
+def _table(model) -> str:
+    return f'"{model._meta.db_table}"'
+
+
+async def get_user(tg_id: int) -> Union[asyncpg.Record, None]:
+    """Пользователь по id чата через кэш
+    """
+    pool = await get_pool()
+    record = user_cache.get(tg_id)
+    if record is MISSING:
+        record = await pool.fetchrow(
+            'SELECT id, username, email, phone '
+            f'FROM {_table(get_user_model())} WHERE tg_id = $1',
+            tg_id,
+            )
+        user_cache.set(tg_id, record)
+    return record
+
+
+def _construct_habit(record: asyncpg.Record) -> HabitRecord:
+    """Привычка для вывода из строки запроса
+    """
+    return HabitRecord(*record)
+
+
+async def get_habits(owner_id: int) -> List[HabitRecord]:
+    """Привычки пользователя в порядке времени выполнения
+    """
+    pool = await get_pool()
+    records = await pool.fetch(
+        f'SELECT {", ".join(HABIT_COLUMNS)} '
+        f'FROM {_table(Habit)} WHERE owner_id = $1 '
+        'ORDER BY minute_of_day, id',
+        owner_id,
+        )
+    return [_construct_habit(record) for record in records]
+
+
+async def get_next_habit(owner_id: int,
+                         minute_of_day: int,
+                         ) -> Tuple[Union[HabitRecord, None], bool]:
+    """Следующая привычка пользователя с указанной минуты дня
+
+    Returns:
+        Tuple[Union[HabitRecord, None], bool]: Следующая привычка
+        и есть ли у пользователя привычки
+    """
+    pool = await get_pool()
+    record = await pool.fetchrow(
+        f'SELECT {", ".join(HABIT_COLUMNS)} '
+        f'FROM {_table(Habit)} '
+        'WHERE owner_id = $1 AND minute_of_day >= $2 '
+        'ORDER BY minute_of_day, id LIMIT 1',
+        owner_id,
+        minute_of_day,
+        )
+    if record is not None:
+        return _construct_habit(record), True
+    exists = await pool.fetchval(
+        f'SELECT EXISTS (SELECT 1 FROM {_table(Habit)} '
+        'WHERE owner_id = $1)',
+        owner_id,
+        )
+    return None, exists
+
+
+async def get_info(tg_id: int) -> Union[asyncpg.Record, None]:
+    """Пользователь по id чата с количеством полезных
+    и приятных привычек одним запросом
+
+    Кэш пользователей не используется, счетчики
+    меняются при каждом создании и удалении привычки
+    """
+    pool = await get_pool()
+    return await pool.fetchrow(
+        'SELECT u.id, u.username, u.email, u.phone, '
+        'count(h.id) FILTER (WHERE NOT h.is_nice_habit) AS habits, '
+        'count(h.id) FILTER (WHERE h.is_nice_habit) AS nice_habits '
+        f'FROM {_table(get_user_model())} AS u '
+        f'LEFT JOIN {_table(Habit)} AS h ON h.owner_id = u.id '
+        'WHERE u.tg_id = $1 '
+        'GROUP BY u.id',
+        tg_id,
+        )
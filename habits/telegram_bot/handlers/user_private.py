@@ -5,6 +5,7 @@ from aiogram.filters import CommandStart, Command, or_f
 from aiogram.enums import ParseMode
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.db.models import Q
 from django.urls import reverse
 from django.core.exceptions import ObjectDoesNotExist
@@ -12,9 +13,13 @@ from django.core.exceptions import ObjectDoesNotExist
 from django_celery_beat.models import PeriodicTask
 
 from filters.chat_types import ChatTypeFilter
-from habits.models import Habit
 from keyboards.reply import start_kb
-from utils import get_list_habits, get_next_habit, get_info
+from utils import (get_minute_of_day,
+                   render_habits,
+                   render_next_habit,
+                   render_info,
+                   )
+import db
 
 
 REGISTER_USER_URL = f'http://127.0.0.1:8000{reverse("users:user_create")}'
@@ -32,28 +37,34 @@ async def start_cmd(message: types.Message):
         )
 
 
+async def answer_unauthorized(message: types.Message) -> None:
+    await message.answer(
+        f'{message.from_user.first_name}, вы не авторизованы',
+        )
+
+
+async def get_authorized_user(message: types.Message):
+    """Пользователь чата или ответ о том что он не авторизован
+    """
+    user = await db.get_user(message.chat.id)
+    if user is None:
+        await answer_unauthorized(message)
+    return user
+
+
 @user_private_router.message(
     or_f(Command('list'), F.text.lower().contains('список')),
     )
 async def list_habits(message: types.Message):
     """Вывод списка привычек
     """
-    try:
-        user = await get_user_model().objects.aget(tg_id=message.chat.id)
-    except ObjectDoesNotExist:
-        await message.answer(
-            f'{message.from_user.first_name}, вы не авторизованы',
-            )
+    user = await get_authorized_user(message)
+    if user is None:
         return
 
-    list_of_habits = Habit.objects.filter(
-        owner=user,
-        ).select_related(
-            'time_to_do',
-            'periodic',
-            )
-    if await list_of_habits.aexists():
-        text = await get_list_habits(list_of_habits)
+    habits = await db.get_habits(user['id'])
+    if habits:
+        text = render_habits(habits)
     else:
         text = 'Привычек пока что нет'
     await message.answer(text, parse_mode=ParseMode.HTML)
@@ -65,22 +76,15 @@ async def list_habits(message: types.Message):
 async def next(message: types.Message):
     """Вывод следующей привычки
     """
-    try:
-        user = await get_user_model().objects.aget(tg_id=message.chat.id)
-    except ObjectDoesNotExist:
-        await message.answer(
-            f'{message.from_user.first_name}, вы не авторизованы',
-            )
+    user = await get_authorized_user(message)
+    if user is None:
         return
 
-    list_of_habits = Habit.objects.filter(
-        owner=user,
-        ).select_related(
-            'time_to_do',
-            'periodic',
-            )
-    if await list_of_habits.aexists():
-        text = await get_next_habit(list_of_habits)
+    habit, exists = await db.get_next_habit(user['id'],
+                                            get_minute_of_day(),
+                                            )
+    if exists:
+        text = render_next_habit(habit)
     else:
         text = 'Привычек пока что нет'
     await message.answer(text, parse_mode=ParseMode.HTML)
@@ -90,18 +94,16 @@ async def next(message: types.Message):
     or_f(Command('info'), F.text.lower().contains('инфо')),
     )
 async def info(message: types.Message):
-    """Вывод следующей привычки
+    """Вывод информации о пользователе
     """
-    try:
-        user = await get_user_model().objects.aget(
-            tg_id=message.chat.id,
-            )
-    except ObjectDoesNotExist:
-        await message.answer(
-            f'{message.from_user.first_name}, вы не авторизованы',
-            )
+    user = await db.get_info(message.chat.id)
+    if user is None:
+        await answer_unauthorized(message)
         return
-    text = await get_info(user)
+
+    text = render_info(user['username'], user['email'], user['phone'],
+                       user['habits'], user['nice_habits'],
+                       )
     await message.answer(text, parse_mode=ParseMode.HTML)
 
 
@@ -122,7 +124,16 @@ async def phone(message: types.Message):
 
     if not user.tg_id:
         user.tg_id = message.chat.id
-        await user.asave(update_fields=('tg_id',))
+        try:
+            await user.asave(update_fields=('tg_id',))
+        except IntegrityError:
+            await message.answer(
+                f'{message.from_user.first_name}, '
+                'этот чат уже привязан к другой учетной записи',
+                )
+            return
+        # Уведомление от User.save придет позже, сбрасываем сразу
+        db.user_cache.evict(user.pk, message.chat.id)
         await message.answer(
             f'{message.from_user.first_name}, '
             'вы были успешно авторизованы',
@@ -135,7 +146,7 @@ async def phone(message: types.Message):
         return
 
     tasks = PeriodicTask.objects.filter(
-        Q(name__contains=f'U-{user.pk}'),
+        Q(habit__owner=user),
         )
 
     if not await tasks.aexists():
@@ -1,8 +1,8 @@
-from django.db.models import QuerySet, Q
-from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from typing import Iterable, Tuple, Union
 
-from habits.models import Habit
+from django.utils import timezone
+
+from habits.models import Habit, PeriodUnit
 
 
 def construct_periodic(minute: str,
@@ -44,70 +44,78 @@ def construct_periodic(minute: str,
                     return f'Каждые {minute} минут'
 
 
-async def get_list_habits(list_of_habits: QuerySet[Habit]) -> str:
-    """Конвертация списка привычек в текст
-    """
-    text = ''
+def construct_schedule(habit: Habit,
+                       ) -> Tuple[Union[str, None], Union[str, None]]:
+    """Время и текст периодичности из числовых полей привычки
 
-    async for habit in list_of_habits:
-        hour = habit.time_to_do.hour
-        min_ = habit.time_to_do.minute
-        day_of_month = habit.periodic.day_of_month
-        periodic = construct_periodic(min_, hour, day_of_month)
-        time = f"{hour}" + ":" + (f"0{min_}" if int(min_) < 10 else min_)
+    Поля могут быть пустыми у строк, записанных без fill_schedule,
+    тогда вместо времени или периодичности возвращается None
+    """
+    time = periodic = None
+    if habit.minute_of_day is not None:
+        hour, min_ = divmod(habit.minute_of_day, 60)
+        time = f'{hour}:{min_:02}'
+    if habit.period_count is None:
+        return time, periodic
+    interval = f'*/{habit.period_count}'
+    match habit.period_unit:
+        case PeriodUnit.DAYS:
+            periodic = construct_periodic('*', '*', interval)
+        case PeriodUnit.HOURS:
+            periodic = construct_periodic('*', interval, '*')
+        case PeriodUnit.MINUTES:
+            periodic = construct_periodic(interval, '*', '*')
+    return time, periodic
+
+
+def render_habit(habit: Habit) -> str:
+    """Текст одной привычки
+    """
+    time, periodic = construct_schedule(habit)
 
-        title = "😌 <b>Приятная привычка</b>" if\
-            habit.is_nice_habit else\
-                "🧐 <b>Полезная привычка</b>"
+    title = "😌 <b>Приятная привычка</b>" if\
+        habit.is_nice_habit else\
+            "🧐 <b>Полезная привычка</b>"
 
-        text += f'''{title}
+    return f'''{title}
 👉 Что делаем: {habit.action}
 ⏱️ В какое время: {time}
-⏲️ Периодичность: {periodic}
-
-'''
-    return text
+⏲️ Периодичность: {periodic}'''
 
 
-async def get_next_habit(list_of_habits: QuerySet[Habit]) -> str:
-    """Вывод следующей привычки
+def render_habits(habits: Iterable[Habit]) -> str:
+    """Конвертация списка привычек в текст
     """
-    local_time = settings.LOCAL_TIME_NOW
-
-    next_habit: Habit = await list_of_habits.filter(
-        Q(time_to_do__hour__gte=local_time.hour),
-        ).afirst()
-    if next_habit:
-        hour = next_habit.time_to_do.hour
-        min_ = next_habit.time_to_do.minute
-        day_of_month = next_habit.periodic.day_of_month
-
-        time = f"{hour}" + ":" + (f"0{min_}" if int(min_) < 10 else min_)
-        periodic = construct_periodic(min_, hour, day_of_month)
-        title = "😌 <b>Приятная привычка</b>" if\
-            next_habit.is_nice_habit else\
-                "🧐 <b>Полезная привычка</b>"
-
-        text = f'''<b>Следующая привычка</b>
-{title}
-👉 Что делаем: {next_habit.action}
-⏱️ В какое время: {time}
-⏲️ Периодичность: {periodic}'''
-    else:
-        text = 'На сегодня привычек больше нет'
+    return ''.join(f'{render_habit(habit)}\n\n' for habit in habits)
 
-    return text
 
-
-async def get_info(user: AbstractUser) -> str:
+def render_next_habit(habit: Union[Habit, None]) -> str:
+    """Текст следующей привычки
+    """
+    if habit is None:
+        return 'На сегодня привычек больше нет'
+    return f'''<b>Следующая привычка</b>
+{render_habit(habit)}'''
+
+
+def render_info(username: str,
+                email: str,
+                phone: str,
+                habits: int,
+                nice_habits: int,
+                ) -> str:
     """Создание информации о пользователе
     """
-    habits = await user.habit_set.filter(is_nice_habit=False).acount()
-    nice_habits = await user.habit_set.filter(is_nice_habit=True).acount()
-    text = f'''Вы зарегистрированы на сайте под именем
-<b>{user.get_username()}</b>
-📧 Ваш эмеил: {user.email}
-📱 Ваш телефон: {user.phone}
+    return f'''Вы зарегистрированы на сайте под именем
+<b>{username}</b>
+📧 Ваш эмеил: {email}
+📱 Ваш телефон: {phone}
 - Количество полезных привычек: {habits}
 - Количество приятных привычек: {nice_habits}'''
-    return text
+
+
+def get_minute_of_day() -> int:
+    """Текущая минута дня по местному времени
+    """
+    local_time = timezone.localtime()
+    return local_time.hour * 60 + local_time.minute
@@ -0,0 +1,61 @@
+from aiohttp import web
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import (SimpleRequestHandler,
+                                            setup_application,
+                                            )
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def construct_webhook_url() -> str:
+    """Публичный адрес webhook бота
+    """
+    return (f'{settings.TELEGRAM_WEBHOOK_URL.rstrip("/")}'
+            f'{settings.TELEGRAM_WEBHOOK_PATH}')
+
+
+def check_webhook_settings() -> None:
+    """Проверка настроек режима webhook
+
+    Без секрета aiogram принимает любой запрос,
+    и кто угодно может отправить обновление от имени любого чата
+    """
+    if settings.TELEGRAM_WEBHOOK_URL and not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise ImproperlyConfigured(
+            'Для режима webhook нужен TELEGRAM_WEBHOOK_SECRET',
+            )
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot) -> web.Application:
+    """Приложение aiohttp принимающее обновления Telegram
+
+    Запросы без заголовка X-Telegram-Bot-Api-Secret-Token
+    с TELEGRAM_WEBHOOK_SECRET отклоняются. Приложение не хранит
+    состояние, поэтому за nginx может работать несколько реплик
+    """
+    check_webhook_settings()
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        ).register(app, path=settings.TELEGRAM_WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, allowed_updates: list) -> None:
+    """Регистрация webhook в Telegram
+
+    Вызывается каждой репликой при запуске, повторная регистрация
+    того же адреса не сбрасывает накопившиеся обновления
+    """
+    await bot.set_webhook(
+        construct_webhook_url(),
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        allowed_updates=allowed_updates,
+        max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=False,
+        )
@@ -4,10 +4,12 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 from django_celery_beat.models import CrontabSchedule, PeriodicTask
 
+from habits.cache import local_cache
 from habits.models import Habit
 
 
@@ -16,6 +18,8 @@ class TestAPIHabit(APITestCase):
     """
 
     def setUp(self) -> None:
+        cache.clear()
+        local_cache.clear()
         self.user = get_user_model().objects.create_user('user',
                                                          'user@gmail.com',
                                                          'usertestuser',
@@ -605,3 +609,85 @@ class TestAPIHabit(APITestCase):
         responce = self.client.delete(url)
 
         self.assertEqual(responce.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_habit_retrieve_one_query(self):
+        """Тест проверки прав на уже загруженной привычке
+        """
+        habit = Habit.objects.create(owner=self.user,
+                                     place='test_place',
+                                     time_to_do=self.cron,
+                                     action='test_actions',
+                                     is_nice_habit=False,
+                                     periodic=self.interval,
+                                     time_to_done=timedelta(minutes=1),
+                                     )
+        user = get_user_model().objects.create_user('owner',
+                                                    'owner@gmail.com',
+                                                    'ownerpass',
+                                                    phone='+7(900)9001000',
+                                                    )
+        url = reverse('habits:habit_retrieve', kwargs={'pk': habit.pk})
+
+        # Привычка и ее связанные привычки
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=user)
+        with self.assertNumQueries(1):
+            response = self.client.delete(
+                reverse('habits:habit_delete', kwargs={'pk': habit.pk}),
+                )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_habit_chain(self):
+        """Тест получения цепочки привычек одним запросом
+        """
+        chain = []
+        for number in range(4):
+            chain.append(Habit.objects.create(
+                owner=self.user,
+                place='test_place',
+                time_to_do=self.cron,
+                action=f'test_actions_{number}',
+                is_nice_habit=not chain,
+                related_habit=chain[-1] if chain else None,
+                periodic=self.interval,
+                time_to_done=timedelta(minutes=1),
+                ))
+        # Цикл, который не запрещают валидаторы
+        Habit.objects.filter(pk=chain[0].pk).update(related_habit=chain[-1])
+        other = Habit.objects.create(owner=self.user,
+                                     place='test_place',
+                                     time_to_do=self.cron,
+                                     action='test_actions',
+                                     is_nice_habit=False,
+                                     periodic=self.interval,
+                                     time_to_done=timedelta(minutes=1),
+                                     )
+        url = reverse('habits:habit_chain', kwargs={'pk': chain[2].pk})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([habit['pk'] for habit in response.data],
+                         [habit.pk for habit in chain],
+                         )
+        self.assertEqual(response.data[1]['related_habit'], chain[0].pk)
+        self.assertEqual(response.data[1]['time_to_done'], '00:01:00')
+        self.assertNotIn(other.pk, [habit['pk'] for habit in response.data])
+
+        response = self.client.get(
+            reverse('habits:habit_chain', kwargs={'pk': other.pk + 1}),
+            )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        user = get_user_model().objects.create_user('owner',
+                                                    'owner@gmail.com',
+                                                    'ownerpass',
+                                                    phone='+7(900)9001000',
+                                                    )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,155 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_celery_beat.models import PeriodicTask
+
+from habits.models import Habit
+
+
+class TestBulkCreateHabits(APITestCase):
+    """Тесты массового создания привычек
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         tg_id=1000000,
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habits:habit_create_bulk')
+
+    def construct_habit(self, number: int, **kwargs) -> dict:
+        data = {
+            'place': f'test_place_{number}',
+            'time_to_do': f'{number % 24}:30',
+            'action': 'test_action',
+            'is_nice_habit': False,
+            'periodic': f'{number % 7 + 1}/0/0',
+            'reward': 'test_reward',
+            'time_to_done': '1:30',
+        }
+        data.update(kwargs)
+        return data
+
+    def test_bulk_create(self):
+        """Тест создания пачки привычек с задачами
+        """
+        data = [self.construct_habit(number) for number in range(3)]
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(len(response.data['created']), 3)
+        self.assertEqual(response.data['created'][1]['periodic'],
+                         'Каждые 2 дня',
+                         )
+        self.assertEqual(response.data['created'][1]['time_to_do'], '1:30')
+        habits = Habit.objects.filter(owner=self.user).select_related('task')
+        self.assertEqual(len(habits), 3)
+        for habit in habits:
+            self.assertEqual(habit.task.name,
+                             f'task_raminder_{habit.pk}/U-{self.user.pk}',
+                             )
+            self.assertTrue(habit.task.enabled)
+
+    def test_bulk_create_queries_not_depend_on_size(self):
+        """Тест числа запросов не зависящего от размера пачки
+        """
+        # Первый запрос создает отметку изменения расписания beat
+        self.client.post(self.url, [self.construct_habit(0)], format='json')
+        queries = []
+        for size in (2, 10):
+            data = [self.construct_habit(number) for number in range(size)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            queries.append(len(context))
+
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(PeriodicTask.objects.count(), 13)
+
+    def test_bulk_create_partial_errors(self):
+        """Тест ошибок отдельных привычек без отмены остальных
+        """
+        stranger = get_user_model().objects.create_user('stranger',
+                                                        'stranger@gmail.com',
+                                                        'strangerpass',
+                                                        phone='+7(900)9001000',
+                                                        )
+        response = self.client.post(self.url, [self.construct_habit(1)],
+                                    format='json',
+                                    )
+        own = response.data['created'][0]['pk']
+        Habit.objects.filter(pk=own).update(is_nice_habit=True)
+        foreign = Habit.objects.create(
+            owner=stranger,
+            place='foreign_place',
+            time_to_do=Habit.objects.get(pk=own).time_to_do,
+            action='foreign_action',
+            is_nice_habit=True,
+            periodic=Habit.objects.get(pk=own).periodic,
+            time_to_done=Habit.objects.get(pk=own).time_to_done,
+            )
+        data = [
+            self.construct_habit(2,
+                                 related_habit=own,
+                                 reward=None,
+                                 is_published=False,
+                                 ),
+            self.construct_habit(3, periodic='0/0/0'),
+            self.construct_habit(4, related_habit=foreign.pk, reward=None),
+            'not a habit',
+            ]
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 1)
+        self.assertEqual(response.data['created'][0]['related_habit'], own)
+        self.assertEqual([error['index']
+                          for error in response.data['errors']],
+                         [1, 2, 3],
+                         )
+        self.assertIn('related_habit', response.data['errors'][1]['errors'])
+        self.assertEqual(Habit.objects.filter(owner=self.user).count(), 2)
+
+    def test_bulk_create_all_invalid(self):
+        """Тест пачки без валидных привычек
+        """
+        response = self.client.post(
+            self.url,
+            [self.construct_habit(1, time_to_do='25:00')],
+            format='json',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Habit.objects.exists())
+
+    def test_bulk_create_not_list(self):
+        """Тест запроса без списка привычек
+        """
+        response = self.client.post(self.url,
+                                    self.construct_habit(1),
+                                    format='json',
+                                    )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REMINDER_DISPATCHER=True)
+    def test_bulk_create_dispatcher(self):
+        """Тест пачки в режиме диспетчера напоминаний
+        """
+        data = [self.construct_habit(number) for number in range(3)]
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(PeriodicTask.objects.exists())
+        self.assertFalse(Habit.objects.filter(
+            next_reminder_at__isnull=True,
+            ).exists())
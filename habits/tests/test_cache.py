@@ -0,0 +1,339 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from django_celery_beat.models import CrontabSchedule
+
+from habits.cache import LocalCache, get_or_compute, local_cache
+from habits.mixins import ETagMixin
+from habits.models import Habit
+from habits.services import (HABITS_USER_VERSION_KEY,
+                             REMINDER_VERSION_KEY,
+                             get_habit_owner,
+                             remember_habit_owner,
+                             )
+
+
+class HabitCacheSetUp:
+    """Пользователь с привычкой и чистым кэшем
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habits:habit_list_private')
+        self.habit = Habit.objects.create(
+            owner=self.user,
+            place='test_place',
+            time_to_do=CrontabSchedule.objects.create(hour=18, minute=41),
+            action='test_action',
+            is_nice_habit=False,
+            periodic=CrontabSchedule.objects.create(minute='*',
+                                                    hour='*',
+                                                    day_of_month='*/1',
+                                                    ),
+            time_to_done=timedelta(minutes=1),
+            reward='test_reward',
+            )
+
+
+class HabitCacheTestCase(HabitCacheSetUp, APITestCase):
+    pass
+
+
+class TestPrivateListCache(HabitCacheTestCase):
+    """Тесты кэша списка личных привычек
+    """
+
+    def test_cached_list(self):
+        """Тест повторного списка без запросов к базе
+        """
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, response.data)
+
+    def test_invalidate_on_update(self):
+        """Тест сброса списка при изменении привычки
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('habits:habit_update', kwargs={'pk': self.habit.pk}),
+                data={'action': 'changed_action'},
+                )
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['results'][0]['action'],
+                         'changed_action',
+                         )
+
+    def test_invalidate_on_delete(self):
+        """Тест сброса списка при удалении привычки
+        """
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse('habits:habit_delete', kwargs={'pk': self.habit.pk}),
+                )
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['count'], 0)
+
+    def test_lists_separated_by_user(self):
+        """Тест раздельных списков пользователей
+        """
+        self.client.get(self.url)
+        other = get_user_model().objects.create_user('other',
+                                                     'other@gmail.com',
+                                                     'otherpass',
+                                                     phone='+7(900)9001000',
+                                                     )
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['count'], 0)
+
+
+class TestInvalidateAfterCommit(HabitCacheSetUp, APITransactionTestCase):
+    """Тесты увеличения версий после фиксации изменений
+
+    TestCase откладывает on_commit до конца теста
+    и не показывает порядок, поэтому транзакции фиксируются
+    """
+
+    def capture_bumps(self, request):
+        """Ключи увеличенных версий и наличие привычки в момент увеличения
+        """
+        bumps = []
+
+        def bump_versions(keys):
+            exists = Habit.objects.filter(pk=self.habit.pk).exists()
+            bumps.extend((key, exists) for key in keys)
+
+        with mock.patch('habits.cache.bump_versions',
+                        side_effect=bump_versions,
+                        ):
+            request()
+        return dict(bumps)
+
+    def test_delete(self):
+        """Тест сброса списка только после удаления привычки
+        """
+        bumps = self.capture_bumps(lambda: self.client.delete(
+            reverse('habits:habit_delete', kwargs={'pk': self.habit.pk}),
+            ))
+
+        self.assertIs(
+            bumps[HABITS_USER_VERSION_KEY.format(self.user.pk)],
+            False,
+            )
+
+    def test_delete_reminder(self):
+        """Тест сброса шаблона напоминания только после удаления привычки
+        """
+        bumps = self.capture_bumps(lambda: self.client.delete(
+            reverse('habits:habit_delete', kwargs={'pk': self.habit.pk}),
+            ))
+
+        self.assertIs(bumps[REMINDER_VERSION_KEY.format(self.habit.pk)],
+                      False,
+                      )
+
+
+class TestETag(HabitCacheTestCase):
+    """Тесты условных запросов по ETag
+    """
+
+    def assertNotModified(self, url: str, queries: int) -> str:
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+        return etag
+
+    def test_private_list(self):
+        """Тест 304 для списка личных привычек и смены ETag
+        """
+        etag = self.assertNotModified(self.url, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('habits:habit_update', kwargs={'pk': self.habit.pk}),
+                data={'action': 'changed_action'},
+                )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_public_list(self):
+        """Тест 304 для списка публичных привычек
+        """
+        self.assertNotModified(reverse('habits:habit_list'), 0)
+
+    def test_retrieve(self):
+        """Тест 304 для привычки и проверки прав без ETag
+        """
+        url = reverse('habits:habit_retrieve', kwargs={'pk': self.habit.pk})
+        # Пока владелец не известен без запроса, ETag не отдается
+        self.assertFalse(self.client.get(url).has_header('ETag'))
+        etag = self.assertNotModified(url, 0)
+
+        other = get_user_model().objects.create_user('other',
+                                                     'other@gmail.com',
+                                                     'otherpass',
+                                                     phone='+7(900)9001000',
+                                                     )
+        self.client.force_authenticate(user=other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestETagMixin(SimpleTestCase):
+    """Тесты примеси ETag
+    """
+
+    def test_without_version(self):
+        """Тест представления без версии, ETag не строится
+        """
+        self.assertIsNone(ETagMixin().get_etag(mock.Mock()))
+
+
+class TestHabitOwnerCache(SimpleTestCase):
+    """Тесты кэша владельцев привычек
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_written_once(self):
+        """Тест записи владельца только при отсутствии записи
+        """
+        remember_habit_owner(Habit(pk=1, owner_id=5))
+        with mock.patch('habits.services.cache.set') as cache_set:
+            remember_habit_owner(Habit(pk=1, owner_id=6))
+
+        cache_set.assert_not_called()
+        self.assertEqual(get_habit_owner(1), 5)
+
+
+class TestPublicFeedCache(HabitCacheTestCase):
+    """Тесты общего кэша публичной ленты
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('habits:habit_list')
+        self.other = get_user_model().objects.create_user(
+            'other',
+            'other@gmail.com',
+            'otherpass',
+            phone='+7(900)9001000',
+            )
+
+    def update(self, data: dict) -> None:
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('habits:habit_update', kwargs={'pk': self.habit.pk}),
+                data=data,
+                )
+
+    def test_shared_between_users(self):
+        """Тест ленты из кэша для другого пользователя
+        """
+        response = self.client.get(self.url)
+        self.client.force_authenticate(user=self.other)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+
+        self.assertEqual(cached.data, response.data)
+
+    def test_private_change_keeps_feed(self):
+        """Тест изменения непубличной привычки без сброса ленты
+        """
+        self.client.get(self.url)
+        self.update({'action': 'changed_action'})
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_publish_invalidates_feed(self):
+        """Тест сброса ленты при публикации и снятии с публикации
+        """
+        self.client.get(self.url)
+        self.update({'is_published': True})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 1)
+
+        self.update({'is_published': False})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_deep_pages_not_cached(self):
+        """Тест страниц ленты за пределами кэша
+        """
+        with self.settings(HABITS_PUBLIC_CACHED_PAGES=1):
+            self.client.get(self.url, {'page': 2})
+            with self.assertNumQueries(1):
+                self.client.get(self.url, {'page': 2})
+
+
+class TestGetOrCompute(SimpleTestCase):
+    """Тесты двухуровневого кэша
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_local_cache(self):
+        """Тест чтения из кэша процесса без общего кэша
+        """
+        compute = mock.Mock(return_value='value')
+        get_or_compute('key:1', compute, 60)
+        cache.clear()
+
+        self.assertEqual(get_or_compute('key:1', compute, 60), 'value')
+        compute.assert_called_once()
+
+    @override_settings(CACHE_LOCK_WAIT=5)
+    def test_stampede(self):
+        """Тест ожидания значения которое вычисляет другой процесс
+        """
+        cache.add('key:2:lock', 1)
+        timer = threading.Timer(0.2, cache.set, ('key:2', 'value'))
+        timer.start()
+        compute = mock.Mock(return_value='other')
+
+        self.assertEqual(get_or_compute('key:2', compute, 60), 'value')
+        compute.assert_not_called()
+
+    def test_local_cache_bounded(self):
+        """Тест вытеснения старых записей кэша процесса
+        """
+        bounded = LocalCache(2)
+        for key in ('a', 'b', 'c'):
+            bounded.set(key, key)
+
+        self.assertIsNone(bounded.get('a'))
+        self.assertEqual(bounded.get('c'), 'c')
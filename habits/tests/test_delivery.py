@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+from celery.exceptions import Retry
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from habits.delivery import (DeliveryError,
+                             DeliveryRetry,
+                             DeliveryUnavailable,
+                             SharedRateLimiter,
+                             TelegramDeliveryClient,
+                             TokenBucket,
+                             )
+from habits.tasks import send_habit_raminder
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    """Заглушка Telegram API, отвечает ответами из очереди сервера
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        body = parse_qs(self.rfile.read(length).decode())
+        self.server.requests.append((self.path,
+                                     body,
+                                     self.client_address,
+                                     ))
+        status, payload, delay = (self.server.responses.pop(0)
+                                  if self.server.responses
+                                  else (200, {'ok': True}, 0))
+        if delay:
+            time.sleep(delay)
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        try:
+            self.wfile.write(content)
+        except BrokenPipeError:
+            # Клиент закрыл соединение по таймауту
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTelegramDeliveryClient(SimpleTestCase):
+    """Тесты клиента доставки на локальной заглушке Telegram API
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          StubTelegramHandler,
+                                          )
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.responses = []
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True,
+                                  )
+        thread.start()
+        host, port = self.server.server_address
+        self.client = TelegramDeliveryClient(
+            token='123:abc',
+            base_url=f'http://{host}:{port}',
+            read_timeout=0.5,
+            rate_limit=100,
+            chat_rate_limit=100,
+            failure_threshold=2,
+            reset_timeout=60,
+            )
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_send_message_keep_alive(self):
+        """Тест отправки сообщений через одно соединение
+        """
+        self.client.send_message(1, 'first')
+        self.client.send_message(2, 'second')
+
+        (path, body, first), (_, _, second) = self.server.requests
+        self.assertEqual(path, '/bot123:abc/sendMessage')
+        self.assertEqual(body['chat_id'], ['1'])
+        self.assertEqual(body['text'], ['first'])
+        self.assertEqual(body['parse_mode'], ['HTML'])
+        self.assertEqual(first, second)
+
+    def test_retry_after(self):
+        """Тест ответа 429 с retry_after
+        """
+        self.server.responses.append(
+            (429, {'ok': False,
+                   'error_code': 429,
+                   'description': 'Too Many Requests: retry after 7',
+                   'parameters': {'retry_after': 7}}, 0),
+            )
+        with self.assertRaises(DeliveryRetry) as error:
+            self.client.send_message(1, 'text')
+
+        self.assertEqual(error.exception.retry_after, 7)
+        # Бот поставлен на паузу, запросы не уходят в API
+        for id_chat in (1, 2):
+            with self.assertRaises(DeliveryRetry) as error:
+                self.client.send_message(id_chat, 'text')
+            self.assertGreater(error.exception.retry_after, 6)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_bad_request(self):
+        """Тест ошибки которую нет смысла повторять
+        """
+        self.server.responses.append(
+            (403, {'ok': False,
+                   'description': 'Forbidden: bot was blocked by the user'},
+             0),
+            )
+        with self.assertRaises(DeliveryError) as error:
+            self.client.send_message(1, 'text')
+
+        self.assertNotIsInstance(error.exception, DeliveryRetry)
+
+    def test_circuit_breaker(self):
+        """Тест размыкания цепи при недоступности API
+        """
+        self.server.responses.extend([(502, {}, 0), (500, {}, 0)])
+        for _ in range(2):
+            with self.assertRaises(DeliveryUnavailable):
+                self.client.send_message(1, 'text')
+        with self.assertRaises(DeliveryUnavailable) as error:
+            self.client.send_message(2, 'text')
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertGreater(error.exception.retry_after, 0)
+
+        # После таймаута пропускается пробный запрос
+        self.client.breaker.opened_at -= 60
+        self.client.send_message(2, 'text')
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    def test_read_timeout(self):
+        """Тест ограничения времени ответа
+        """
+        self.server.responses.append((200, {'ok': True}, 1))
+        with self.assertRaises(DeliveryUnavailable):
+            self.client.send_message(1, 'text')
+
+    def test_chat_rate_limit(self):
+        """Тест ограничения частоты сообщений в чат
+        """
+        self.client.chat_rate_limit = 0.1
+        self.client.max_wait = 0
+        self.client.send_message(1, 'text')
+        with self.assertRaises(DeliveryRetry) as error:
+            self.client.send_message(1, 'text')
+
+        self.assertGreater(error.exception.retry_after, 0)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class TestTokenBucket(SimpleTestCase):
+    """Тесты ведра токенов
+    """
+
+    def test_acquire(self):
+        """Тест выдачи токенов
+        """
+        bucket = TokenBucket(rate=2)
+
+        self.assertEqual(bucket.acquire(0), 0)
+        self.assertEqual(bucket.acquire(0), 0)
+        self.assertIsNone(bucket.acquire(0))
+        self.assertLessEqual(bucket.acquire(1), 0.5)
+
+
+class TestSharedRateLimiter(SimpleTestCase):
+    """Тесты общего для процессов ограничения частоты
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_acquire_shared(self):
+        """Тест общего лимита для клиентов разных процессов
+        """
+        first, second = SharedRateLimiter(2), SharedRateLimiter(2)
+        with mock.patch('habits.delivery.time.time', return_value=100.5):
+            self.assertEqual(first.acquire(0), 0)
+            self.assertEqual(second.acquire(0), 0)
+            self.assertIsNone(first.acquire(0))
+            self.assertEqual(second.acquire(1), 0.5)
+
+    def test_pause_shared(self):
+        """Тест паузы после 429 для всех процессов
+        """
+        SharedRateLimiter(2).pause(5)
+        limiter = SharedRateLimiter(2)
+
+        self.assertIsNone(limiter.acquire(1))
+        self.assertGreater(limiter.wait_time(), 4)
+
+
+class TestSendHabitRaminder(SimpleTestCase):
+    """Тесты задачи напоминания
+    """
+
+    def test_retry_without_blocking(self):
+        """Тест переноса напоминания на retry_after
+        """
+        with mock.patch('habits.tasks.construct_message',
+                        side_effect=DeliveryRetry('flood', 7),
+                        ), \
+                mock.patch.object(send_habit_raminder,
+                                  'retry',
+                                  return_value=Retry(),
+                                  ) as retry, \
+                self.assertRaises(Retry):
+            send_habit_raminder(1, 2)
+
+        self.assertEqual(retry.call_args.kwargs['countdown'], 7)
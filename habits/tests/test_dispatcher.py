@@ -0,0 +1,292 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+from habits.delivery import DeliveryRetry
+from habits.handlers import HandleCrontab
+from habits.models import Habit
+from habits.services import (REMINDER_TIME_PLACEHOLDER,
+                             collect_due_reminders,
+                             construct_next_reminder,
+                             send_reminders,
+                             )
+from habits.tasks import dispatch_habit_raminders, send_habit_raminder_batch
+
+
+@override_settings(REMINDER_DISPATCHER=True)
+class TestReminderDispatcher(APITestCase):
+    """Тесты диспетчера напоминаний
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         tg_id=1000000,
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        data = {
+            'place': 'test_place',
+            'time_to_do': '18:41',
+            'action': 'test_action',
+            'is_nice_habit': False,
+            'periodic': '2/0/0',
+            'reward': 'test_reward',
+            'time_to_done': '1:32',
+        }
+        self.client.post(reverse('habits:habit_create'), data, format='json')
+        self.habit = Habit.objects.get(place='test_place')
+
+    def test_create_habit_without_periodic_task(self):
+        """Тест создания привычки без отдельной задачи
+        """
+        self.assertEqual(PeriodicTask.objects.count(), 0)
+        self.assertIsNotNone(self.habit.next_reminder_at)
+        self.assertGreater(self.habit.next_reminder_at, timezone.now())
+        self.assertEqual(self.habit.next_reminder_at.minute, 41)
+
+    def test_update_habit_reschedule(self):
+        """Тест переноса напоминания при обновлении привычки
+        """
+        url = reverse('habits:habit_update', kwargs={'pk': self.habit.pk})
+        self.client.patch(url, {'periodic': '0/0/30'}, format='json')
+        habit = Habit.objects.get(pk=self.habit.pk)
+
+        self.assertIn(habit.next_reminder_at.minute, (0, 30))
+        self.assertEqual(PeriodicTask.objects.count(), 0)
+
+    def test_collect_due_reminders(self):
+        """Тест выборки наступивших напоминаний и их переноса
+        """
+        due_at = self.habit.next_reminder_at
+        self.assertEqual(collect_due_reminders(due_at - timedelta(minutes=1)),
+                         [])
+
+        reminders = collect_due_reminders(due_at)
+        habit = Habit.objects.get(pk=self.habit.pk)
+
+        self.assertEqual(reminders, [(self.habit.pk, 1000000)])
+        self.assertGreater(habit.next_reminder_at, due_at)
+        self.assertEqual(collect_due_reminders(due_at), [])
+
+    def test_collect_due_reminders_without_chat(self):
+        """Тест переноса напоминания пользователя без Telegram
+        """
+        self.user.tg_id = None
+        self.user.save(update_fields=('tg_id',))
+        due_at = self.habit.next_reminder_at
+
+        self.assertEqual(collect_due_reminders(due_at), [])
+        self.assertGreater(
+            Habit.objects.get(pk=self.habit.pk).next_reminder_at,
+            due_at,
+            )
+
+    def test_dispatch_task_in_batches(self):
+        """Тест раздачи напоминаний пачками
+        """
+        due_at = self.habit.next_reminder_at
+        with mock.patch('habits.tasks.collect_due_reminders',
+                        return_value=[(self.habit.pk, 1000000)],
+                        ) as collect, \
+                mock.patch('habits.tasks.send_habit_raminder_batch.delay',
+                           ) as delay:
+            result = dispatch_habit_raminders()
+
+        collect.assert_called_once()
+        delay.assert_called_once_with([(self.habit.pk, 1000000)])
+        self.assertEqual(result, 1)
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).next_reminder_at,
+                         due_at)
+
+    def test_migrate_raminders_command(self):
+        """Тест перевода существующих задач на диспетчер
+        """
+        Habit.objects.update(next_reminder_at=None)
+        PeriodicTask.objects.create(
+            name=f'task_raminder_{self.habit.pk}/U-{self.user.pk}',
+            task='habits.tasks.send_habit_raminder',
+            crontab=HandleCrontab.get(41, 18, '*'),
+            )
+        call_command('migrate_raminders', stdout=mock.MagicMock())
+
+        self.assertEqual(PeriodicTask.objects.count(), 0)
+        self.assertIsNotNone(
+            Habit.objects.get(pk=self.habit.pk).next_reminder_at,
+            )
+
+    @override_settings(REMINDER_DISPATCHER=False)
+    def test_migrate_raminders_command_disabled(self):
+        """Тест запрета перевода при выключенном диспетчере
+        """
+        with self.assertRaises(CommandError):
+            call_command('migrate_raminders')
+
+    def test_construct_next_reminder(self):
+        """Тест расчета следующего срабатывания кронтаба
+        """
+        after = datetime(2024, 7, 30, 18, 41, tzinfo=dt_timezone.utc)
+        hourly = CrontabSchedule(minute=0, hour='*/12')
+        minutes = CrontabSchedule(minute='*/30')
+        every_two_days = CrontabSchedule(minute=41,
+                                         hour=18,
+                                         day_of_month='*/2',
+                                         )
+
+        self.assertEqual(construct_next_reminder(hourly, after),
+                         datetime(2024, 7, 31, 0, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(construct_next_reminder(minutes, after),
+                         datetime(2024, 7, 30, 19, 0,
+                                  tzinfo=dt_timezone.utc))
+        self.assertEqual(construct_next_reminder(every_two_days, after),
+                         datetime(2024, 7, 31, 18, 41,
+                                  tzinfo=dt_timezone.utc))
+
+
+class TestSendReminders(APITestCase):
+    """Тесты пакетной отправки напоминаний
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         tg_id=1000000,
+                                                         )
+        self.cron = CrontabSchedule.objects.create(hour=18, minute=41)
+        self.interval = CrontabSchedule.objects.create(minute='*',
+                                                       hour='*',
+                                                       day_of_month='*/1',
+                                                       )
+        self.related = Habit.objects.create(owner=self.user,
+                                            place='related_place',
+                                            time_to_do=self.cron,
+                                            action='related_action',
+                                            is_nice_habit=True,
+                                            periodic=self.interval,
+                                            time_to_done=timedelta(
+                                                minutes=1,
+                                                ),
+                                            )
+        self.habits = [
+            Habit.objects.create(owner=self.user,
+                                 place=f'test_place_{number}',
+                                 time_to_do=self.cron,
+                                 action='test_action',
+                                 is_nice_habit=False,
+                                 related_habit=self.related,
+                                 periodic=self.interval,
+                                 time_to_done=timedelta(minutes=1),
+                                 )
+            for number in range(5)
+            ]
+        self.reminders = [(habit.pk, 1000000 + habit.pk)
+                          for habit in self.habits]
+
+    def test_send_reminders_one_query(self):
+        """Тест отправки пачки с загрузкой привычек одним запросом
+        """
+        client = mock.MagicMock()
+        with mock.patch('habits.services.get_delivery_client',
+                        return_value=client,
+                        ), self.assertNumQueries(1):
+            retries = send_reminders(self.reminders)
+
+        self.assertEqual(retries, [])
+        self.assertEqual(client.send_message.call_count, 5)
+        chats = {call.args[0] for call in client.send_message.call_args_list}
+        self.assertEqual(chats, {id_chat for _, id_chat in self.reminders})
+        self.assertIn('related_action',
+                      client.send_message.call_args_list[0].args[1],
+                      )
+
+    def test_send_reminders_cached(self):
+        """Тест повторной отправки пачки без запросов к базе
+        """
+        client = mock.MagicMock()
+        with mock.patch('habits.services.get_delivery_client',
+                        return_value=client,
+                        ):
+            send_reminders(self.reminders)
+            with self.assertNumQueries(0):
+                send_reminders(self.reminders)
+
+        self.assertEqual(client.send_message.call_count, 10)
+        text = client.send_message.call_args_list[-1].args[1]
+        self.assertIn(timezone.localtime().strftime('%H:%M'), text)
+        self.assertNotIn(REMINDER_TIME_PLACEHOLDER, text)
+
+    def test_reminder_cache_invalidation(self):
+        """Тест сброса шаблона при изменении связанной привычки
+        """
+        client = mock.MagicMock()
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('habits.services.get_delivery_client',
+                        return_value=client,
+                        ):
+            send_reminders(self.reminders[:1])
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    reverse('habits:habit_update',
+                            kwargs={'pk': self.related.pk},
+                            ),
+                    data={'action': 'changed_action'},
+                    )
+            send_reminders(self.reminders[:1])
+
+        self.assertEqual(response.status_code, 200)
+        first, second = client.send_message.call_args_list
+        self.assertIn('related_action', first.args[1])
+        self.assertIn('changed_action', second.args[1])
+
+    def test_send_reminders_retry(self):
+        """Тест повторной отправки напоминаний упершихся в лимит
+        """
+        client = mock.MagicMock()
+        client.send_message.side_effect = [None, DeliveryRetry('flood', 3),
+                                           None, DeliveryRetry('flood', 9),
+                                           None,
+                                           ]
+        with mock.patch('habits.services.get_delivery_client',
+                        return_value=client,
+                        ), \
+                mock.patch('habits.tasks.send_habit_raminder_batch'
+                           '.apply_async',
+                           ) as apply_async:
+            delivered = send_habit_raminder_batch(self.reminders)
+
+        self.assertEqual(delivered, 3)
+        ((retries, attempt),), options = apply_async.call_args
+        self.assertEqual(len(retries), 2)
+        self.assertEqual(attempt, 1)
+        self.assertEqual(options, {'countdown': 9})
+
+    @override_settings(TELEGRAM_MAX_RETRIES=2)
+    def test_send_reminders_retry_limit(self):
+        """Тест прекращения повторов пачки после TELEGRAM_MAX_RETRIES
+        """
+        client = mock.MagicMock()
+        client.send_message.side_effect = DeliveryRetry('flood', 3)
+        with mock.patch('habits.services.get_delivery_client',
+                        return_value=client,
+                        ), \
+                mock.patch('habits.tasks.send_habit_raminder_batch'
+                           '.apply_async',
+                           ) as apply_async, \
+                self.assertLogs('habits.tasks', 'WARNING'):
+            delivered = send_habit_raminder_batch(self.reminders, 2)
+
+        self.assertEqual(delivered, 0)
+        apply_async.assert_not_called()
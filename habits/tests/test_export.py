@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+
+from habits.handlers import HandleCrontab
+from habits.models import Habit
+
+
+@override_settings(HABITS_EXPORT_CHUNK_SIZE=2)
+class TestHabitExport(APITestCase):
+    """Тесты выгрузки привычек пользователя
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habits:habit_export')
+        cron = HandleCrontab.get(5, 18, '*')
+        interval = HandleCrontab.get('*', '*/3', '*')
+        self.habits = [
+            Habit.objects.create(owner=self.user,
+                                 place='парк',
+                                 time_to_do=cron,
+                                 action=f'прогулка {number}',
+                                 is_nice_habit=False,
+                                 periodic=interval,
+                                 reward='награда' if number else None,
+                                 time_to_done=timedelta(minutes=1),
+                                 )
+            for number in range(5)
+            ]
+        other = get_user_model().objects.create_user('other',
+                                                     'other@gmail.com',
+                                                     'otherpass',
+                                                     phone='+7(900)9001000',
+                                                     )
+        Habit.objects.create(owner=other,
+                             place='дом',
+                             time_to_do=cron,
+                             action='чужая привычка',
+                             is_nice_habit=False,
+                             periodic=interval,
+                             time_to_done=timedelta(minutes=1),
+                             )
+
+    def test_export_ndjson(self):
+        """Тест выгрузки в NDJSON
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/x-ndjson',
+            ))
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['pk'] for row in rows],
+                         [habit.pk for habit in self.habits],
+                         )
+        self.assertEqual(rows[1], {
+            'pk': self.habits[1].pk,
+            'place': 'парк',
+            'time_to_do': '18:05',
+            'action': 'прогулка 1',
+            'is_nice_habit': False,
+            'related_habit': None,
+            'periodic': 'Каждые 3 часа',
+            'reward': 'награда',
+            'time_to_done': '00:01:00',
+            'is_published': False,
+            'url_bot': self.habits[1].url_bot,
+            })
+
+    def test_export_csv(self):
+        """Тест выгрузки в CSV
+        """
+        response = self.client.get(self.url, {'type': 'csv'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('habits.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(
+            b''.join(response.streaming_content).decode(),
+            )))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['periodic'], 'Каждые 3 часа')
+        self.assertEqual(rows[0]['reward'], '')
+
+    def test_export_unknown_type(self):
+        """Тест неизвестного формата
+        """
+        response = self.client.get(self.url, {'type': 'xml'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,10 +1,12 @@
+from django.core.cache import cache
 from django.test import TestCase
 
 from django_celery_beat.models import CrontabSchedule
 
 from datetime import timedelta
 
-from habits.handlers import (HandleInterval,
+from habits.handlers import (HandleCrontab,
+                             HandleInterval,
                              HandleTimeToDo,
                              HandleTimeToDone,
                              HandleCronScheduleToTask,
@@ -222,3 +224,57 @@ class TestHandlersHabits(TestCase):
         result = HandleTimeToDone.get_time(value['date'])
 
         self.assertEqual((result.seconds), 59)
+
+
+class TestHandleCrontab(TestCase):
+    """Тесты получения кронтабов
+    """
+
+    def setUp(self):
+        cache.clear()
+        HandleCrontab.cache_clear()
+
+    def test_get_one_query(self):
+        """Тест создания кронтаба одним запросом и поиска
+        без записи в существующую строку
+        """
+        with self.assertNumQueries(1):
+            created = HandleCrontab.get(12, 9, '*')
+        with self.assertNumQueries(2) as context:
+            found = HandleCrontab.get('12', '9', '*')
+
+        self.assertIn('DO NOTHING', context.captured_queries[0]['sql'])
+        self.assertNotIn('UPDATE', context.captured_queries[0]['sql'])
+
+        self.assertEqual(created.pk, found.pk)
+        self.assertEqual(CrontabSchedule.objects.filter(
+            minute='12',
+            hour='9',
+            ).count(), 1)
+
+    def test_get_cached_after_commit(self):
+        """Тест кэша кронтабов после фиксации транзакции
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            crontab = HandleCrontab.get('*', '*', '*/3')
+        with self.assertNumQueries(0):
+            cached = HandleCrontab.get('*', '*', '*/3')
+        HandleCrontab.cache_clear()
+        with self.assertNumQueries(0):
+            shared = HandleCrontab.get('*', '*', '*/3')
+
+        self.assertEqual(cached.pk, crontab.pk)
+        self.assertEqual(shared.pk, crontab.pk)
+        self.assertEqual(cached.day_of_month, '*/3')
+
+    def test_resolve_many(self):
+        """Тест получения нескольких кронтабов не более чем двумя запросами
+        """
+        HandleCrontab.get(30, 7, '*')
+        keys = [(30, 7, '*'), (0, '*/2', '*'), ('*', '*', '*/1')]
+        # Вставка новых и выборка одного существующего
+        with self.assertNumQueries(2):
+            crontabs = HandleCrontab.resolve(keys)
+
+        self.assertEqual(len(crontabs), 3)
+        self.assertEqual(CrontabSchedule.objects.count(), 3)
@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from django_celery_beat.models import PeriodicTask
+
+from habits.cache import local_cache
+from habits.handlers import HandleCrontab
+from habits.models import Habit
+
+
+class TestImportHabits(APITestCase):
+    """Тесты загрузки привычек командой import_habits
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        HandleCrontab.cache_clear()
+        # Кронтабы зафиксированные captureOnCommitCallbacks
+        # откатываются вместе с тестом
+        self.addCleanup(HandleCrontab.cache_clear)
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         tg_id=1000000,
+                                                         )
+        self.other = get_user_model().objects.create_user(
+            'other',
+            'other@gmail.com',
+            'otherpass',
+            phone='+7(900)9001000',
+            )
+        self.foreign = Habit.objects.create(
+            owner=self.other,
+            place='test_place',
+            time_to_do=HandleCrontab.get(30, 18, '*'),
+            action='test_action',
+            is_nice_habit=True,
+            periodic=HandleCrontab.get('*', '*', '*/1'),
+            time_to_done=timedelta(minutes=1),
+            )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def construct_habit(self, number: int, **kwargs) -> dict:
+        data = {
+            'owner': self.user.pk,
+            'place': f'test_place_{number}',
+            'time_to_do': f'{number % 24}:30',
+            'action': 'test\taction\nс переносом',
+            'is_nice_habit': False,
+            'periodic': f'{number % 7 + 1}/0/0',
+            'reward': 'test_reward',
+            'time_to_done': '1:30',
+        }
+        data.update(kwargs)
+        return data
+
+    def write_ndjson(self, lines) -> str:
+        path = os.path.join(self.directory.name, 'habits.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write((line if isinstance(line, str)
+                            else json.dumps(line, ensure_ascii=False)) + '\n')
+        return path
+
+    def import_habits(self, path, **options):
+        call_command('import_habits', path, stdout=mock.MagicMock(),
+                     **options)
+        with open(f'{path}.rejected.ndjson', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_import_ndjson(self):
+        """Тест загрузки пачками с задачами и отклоненными строками
+        """
+        path = self.write_ndjson([
+            *(self.construct_habit(number) for number in range(5)),
+            self.construct_habit(5, time_to_do='25:30'),
+            '{broken',
+            self.construct_habit(6, owner=0),
+            self.construct_habit(7, reward=None,
+                                 related_habit=self.foreign.pk),
+            ])
+
+        rejected = self.import_habits(path, chunk_size=2)
+
+        self.assertEqual([item['line'] for item in rejected], [6, 7, 8, 9])
+        self.assertIn('related_habit', rejected[-1]['errors'])
+        habits = Habit.objects.filter(
+            owner=self.user,
+            ).select_related('task', 'task__crontab').order_by('pk')
+        self.assertEqual(len(habits), 5)
+        habit = habits[1]
+        self.assertEqual(habit.action, 'test\taction\nс переносом')
+        self.assertEqual(habit.time_to_done, timedelta(minutes=1, seconds=30))
+        self.assertEqual(habit.minute_of_day, 90)
+        self.assertEqual(habit.period_count, 2)
+        self.assertEqual(habit.task.name,
+                         f'task_raminder_{habit.pk}/U-{self.user.pk}',
+                         )
+        self.assertEqual(json.loads(habit.task.kwargs),
+                         {'id_habit': habit.pk, 'id_chat': 1000000},
+                         )
+        self.assertTrue(habit.task.enabled)
+
+        # Последовательности id продолжаются после загрузки
+        Habit.objects.create(owner=self.user,
+                             place='test_place',
+                             time_to_do=habit.time_to_do,
+                             action='test_action',
+                             is_nice_habit=False,
+                             periodic=habit.periodic,
+                             time_to_done=timedelta(minutes=1),
+                             )
+
+    def test_import_csv(self):
+        """Тест загрузки CSV с владельцем из параметра
+        """
+        path = os.path.join(self.directory.name, 'habits.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            rows = [self.construct_habit(number, owner='')
+                    for number in range(3)]
+            rows.append(self.construct_habit(3, owner='', reward='',
+                                             is_nice_habit='true'))
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+        rejected = self.import_habits(path, owner=self.other.pk)
+
+        self.assertEqual(rejected, [])
+        self.assertEqual(Habit.objects.filter(owner=self.other).count(), 5)
+        self.assertEqual(
+            PeriodicTask.objects.filter(enabled=False).count(),
+            4,
+            )
+
+    @override_settings(REMINDER_DISPATCHER=True)
+    def test_import_dispatcher(self):
+        """Тест загрузки без задач в режиме диспетчера
+        """
+        path = self.write_ndjson([self.construct_habit(1)])
+        tasks = PeriodicTask.objects.count()
+
+        self.assertEqual(self.import_habits(path), [])
+        habit = Habit.objects.get(owner=self.user)
+        self.assertIsNotNone(habit.next_reminder_at)
+        self.assertIsNone(habit.task_id)
+        self.assertEqual(PeriodicTask.objects.count(), tasks)
+
+    def test_import_invalidates_lists(self):
+        """Тест смены списков и ETag после загрузки
+        """
+        self.client.force_authenticate(user=self.user)
+        private_url = reverse('habits:habit_list_private')
+        public_url = reverse('habits:habit_list')
+        etags = {url: self.client.get(url)['ETag']
+                 for url in (private_url, public_url)}
+        path = self.write_ndjson([
+            self.construct_habit(1, is_published=True, reward=None),
+            ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.import_habits(path), [])
+
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertEqual(response.data['count'], 1)
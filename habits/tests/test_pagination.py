@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_celery_beat.models import CrontabSchedule
+
+from habits.cache import local_cache
+from habits.models import Habit
+
+
+class TestPaginateHabits(APITestCase):
+    """Тесты пагинации списков привычек
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habits:habit_list')
+        interval = CrontabSchedule.objects.create(minute='*',
+                                                  hour='*',
+                                                  day_of_month='*/1',
+                                                  )
+        crontabs = [CrontabSchedule.objects.create(hour=hour, minute=0)
+                    for hour in (10, 9, 18)]
+        self.habits = [
+            Habit.objects.create(owner=self.user,
+                                 place='test_place',
+                                 time_to_do=crontabs[number % 3],
+                                 action=f'test_action_{number}',
+                                 is_nice_habit=False,
+                                 periodic=interval,
+                                 time_to_done=timedelta(minutes=1),
+                                 is_published=True,
+                                 )
+            for number in range(12)
+            ]
+        self.expected = [habit.pk for habit in sorted(
+            self.habits,
+            key=lambda habit: (habit.minute_of_day, habit.pk),
+            )]
+
+    def test_cursor_walk(self):
+        """Тест обхода списка по курсору вперед и назад
+        """
+        url, pks, pages = f'{self.url}?cursor=', [], []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            for query in context.captured_queries:
+                self.assertNotIn('COUNT', query['sql'])
+                self.assertNotIn('OFFSET', query['sql'])
+            pks.extend(habit['pk'] for habit in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+
+        self.assertEqual(pks, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('count', pages[0])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         self.expected[5:10],
+                         )
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         self.expected[:5],
+                         )
+        self.assertIsNone(response.data['previous'])
+
+    def test_cursor_page_size(self):
+        """Тест размера страницы по курсору
+        """
+        response = self.client.get(self.url, {'cursor': '', 'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         self.expected[10:],
+                         )
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        """Тест неверного курсора
+        """
+        response = self.client.get(self.url, {'cursor': 'bad'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number(self):
+        """Тест постраничной пагинации без курсора
+        """
+        response = self.client.get(self.url, {'page': 2})
+
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         self.expected[5:10],
+                         )
+
+    def test_list_queries_not_depend_on_page_size(self):
+        """Тест числа запросов страницы со связанными привычками
+        """
+        for habit in self.habits[1:]:
+            habit.related_habit = self.habits[0]
+        Habit.objects.bulk_update(self.habits[1:], ('related_habit',))
+        for params in ({'page_size': 2}, {'page_size': 10}):
+            with self.assertNumQueries(3):
+                response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with self.assertNumQueries(2):
+                self.client.get(self.url, {'cursor': '', **params})
+            with self.assertNumQueries(2):
+                self.client.get(reverse('habits:habit_list_private'),
+                                {'cursor': '', **params},
+                                )
+
+        first = next(habit for habit in response.data['results']
+                     if habit['pk'] == self.habits[0].pk)
+        self.assertEqual(len(first['related_habit']), 11)
@@ -113,3 +113,39 @@ class TestPeriodicTask(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Habit.objects.count(), 0)
         self.assertEqual(PeriodicTask.objects.count(), 0)
+
+    def test_periodic_task_linked_to_habit(self):
+        """Тест связи привычки с ее задачей без поиска по имени
+        """
+        url = reverse('habits:habit_create')
+        for number in range(10):
+            self.client.post(url, {
+                'place': f'test_place_{number}',
+                'time_to_do': '10:00',
+                'action': 'test_action',
+                'is_nice_habit': False,
+                'periodic': '1/0/0',
+                'reward': 'test_reward',
+                'time_to_done': '1:00',
+            }, format='json')
+        # Обновление и удаление затрагивают только задачу своей привычки
+        habit = Habit.objects.get(place='test_place_9')
+        url = reverse('habits:habit_update', kwargs={'pk': self.habit.pk})
+        response = self.client.patch(url, {'time_to_do': '3:04'},
+                                     format='json',
+                                     )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.habit.task, self.task)
+        self.assertEqual(PeriodicTask.objects.get(pk=self.task.pk,
+                                                  ).crontab.hour,
+                         '3',
+                         )
+        self.assertEqual(habit.task.crontab.hour, '10')
+
+        url = reverse('habits:habit_delete', kwargs={'pk': self.habit.pk})
+        self.client.delete(url)
+
+        self.assertFalse(PeriodicTask.objects.filter(pk=self.task.pk,
+                                                     ).exists())
+        self.assertEqual(PeriodicTask.objects.count(), 10)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+
+from django_celery_beat.models import CrontabSchedule
+
+from habits.cache import local_cache
+from habits.filters import HabitSearchFilter, is_trigram_available
+from habits.models import Habit
+
+
+class TestHabitSearch(APITestCase):
+    """Тесты поиска по публичной ленте
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('habits:habit_list')
+        self.cron = CrontabSchedule.objects.create(hour=18, minute=30)
+        self.interval = CrontabSchedule.objects.create(minute='*',
+                                                       hour='*',
+                                                       day_of_month='*/1',
+                                                       )
+        # Текст в нижнем регистре, в базе с локалью C
+        # кириллица не приводится к нижнему регистру
+        self.walks = [
+            self.create_habit(f'прогулка номер {number}', 'улица')
+            for number in range(6)
+            ]
+        self.best = self.create_habit('прогулка, долгая прогулка', 'парк')
+        self.create_habit('чтение книги', 'дом')
+        self.create_habit('прогулка', 'парк', is_published=False)
+
+    def create_habit(self, action, place, is_published=True):
+        return Habit.objects.create(owner=self.user,
+                                    place=place,
+                                    time_to_do=self.cron,
+                                    action=action,
+                                    is_nice_habit=False,
+                                    periodic=self.interval,
+                                    time_to_done=timedelta(minutes=1),
+                                    is_published=is_published,
+                                    )
+
+    def test_search(self):
+        """Тест поиска по словоформам с сортировкой по рангу
+        """
+        response = self.client.get(self.url, {'search': 'прогулки',
+                                              'page_size': 15,
+                                              })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pks = [habit['pk'] for habit in response.data['results']]
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(pks[0], self.best.pk)
+        self.assertEqual(pks[1:], [habit.pk for habit in self.walks])
+
+        response = self.client.get(self.url, {'search': 'в парке'})
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         [self.best.pk],
+                         )
+
+    def test_search_cursor(self):
+        """Тест обхода результатов поиска по курсору
+        """
+        expected = [self.best.pk] + [habit.pk for habit in self.walks]
+        url = '{}?{}'.format(self.url, urlencode({'search': 'прогулка',
+                                                  'page_size': 3,
+                                                  'cursor': '',
+                                                  }))
+        pks, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pks.extend(habit['pk'] for habit in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+
+        self.assertEqual(pks, expected)
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual([habit['pk'] for habit in response.data['results']],
+                         expected[3:6],
+                         )
+
+    def test_search_index(self):
+        """Тест использования полнотекстового индекса
+        """
+        queryset = HabitSearchFilter(
+            {'search': 'прогулка'},
+            queryset=Habit.objects.filter(is_published=True),
+            ).qs
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('habits_published_search_idx', queryset.explain())
+
+    def test_search_typo(self):
+        """Тест поиска с опечаткой
+        """
+        if not is_trigram_available():
+            self.skipTest('pg_trgm не установлен')
+        response = self.client.get(self.url, {'search': 'прогулко'})
+
+        self.assertIn(self.best.pk,
+                      [habit['pk'] for habit in response.data['results']],
+                      )
@@ -0,0 +1,174 @@
+from datetime import timedelta
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_celery_beat.models import CrontabSchedule
+
+from habits.cache import local_cache
+from habits.models import Habit
+from habits.serializers import (HabitRetieveFastSearilizer,
+                                HabitRetieveSearilizer,
+                                )
+
+
+class HabitSerializerTestCase(APITestCase):
+    """Привычки владельца со связанными привычками
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.client.force_authenticate(user=self.user)
+        interval = CrontabSchedule.objects.create(minute='*',
+                                                  hour='*',
+                                                  day_of_month='*/1',
+                                                  )
+        crontabs = [CrontabSchedule.objects.create(hour=hour, minute=30)
+                    for hour in (10, 9, 18)]
+        crontabs.append(CrontabSchedule.objects.create(hour='*',
+                                                       minute='*/5',
+                                                       ))
+        self.habits = [
+            Habit.objects.create(owner=self.user,
+                                 place='место "в кавычках"',
+                                 time_to_do=crontabs[number % 4],
+                                 action=f'test_action_{number}',
+                                 is_nice_habit=False,
+                                 periodic=interval,
+                                 reward='награда' if number % 2 else None,
+                                 time_to_done=timedelta(minutes=number % 3,
+                                                        seconds=30),
+                                 is_published=bool(number % 3),
+                                 url_bot='https://t.me/test_bot',
+                                 )
+            for number in range(15)
+            ]
+        for number, habit in enumerate(self.habits[:4]):
+            for _ in range(number % 3):
+                Habit.objects.create(owner=self.user,
+                                     place='test_place',
+                                     time_to_do=crontabs[number],
+                                     action='nice_action',
+                                     is_nice_habit=True,
+                                     related_habit=habit,
+                                     periodic=interval,
+                                     time_to_done=timedelta(seconds=90),
+                                     is_published=False,
+                                     )
+
+    def render_expected(self, queryset):
+        return JSONRenderer().render(
+            HabitRetieveSearilizer(queryset.prefetch_related('related'),
+                                   many=True,
+                                   ).data,
+            )
+
+
+class TestHabitRetieveFastSearilizer(HabitSerializerTestCase):
+    """Тесты совпадения быстрого вывода с сериализатором привычки
+    """
+
+    def test_represent(self):
+        """Тест побайтового совпадения вывода списка
+        """
+        queryset = Habit.objects.filter(is_nice_habit=False)
+
+        self.assertEqual(
+            JSONRenderer().render(HabitRetieveFastSearilizer.represent(
+                HabitRetieveFastSearilizer.get_rows(queryset),
+                )),
+            self.render_expected(queryset),
+            )
+
+    def test_list(self):
+        """Тест страницы из 15 привычек: количество, страница, связанные
+        """
+        url = reverse('habits:habit_list_private')
+        with self.assertNumQueries(3):
+            response = self.client.get(f'{url}?page_size=15')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pks = [habit['pk'] for habit in response.data['results']]
+        queryset = Habit.objects.filter(pk__in=pks).order_by('minute_of_day',
+                                                             'id',
+                                                             )
+        self.assertEqual(JSONRenderer().render(response.data['results']),
+                         self.render_expected(queryset),
+                         )
+
+    def test_retrieve(self):
+        """Тест совпадения вывода одной привычки
+        """
+        habit = self.habits[2]
+        response = self.client.get(
+            reverse('habits:habit_retrieve', args=(habit.pk,)),
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            JSONRenderer().render(response.data),
+            JSONRenderer().render(HabitRetieveSearilizer(habit).data),
+            )
+
+
+class TestSparseFields(HabitSerializerTestCase):
+    """Тесты сокращения полей вывода параметром fields
+    """
+
+    def test_list(self):
+        """Тест списка только с нужными полями и колонками
+        """
+        url = reverse('habits:habit_list_private')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f'{url}?page_size=15&fields=time_to_do,pk,action',
+                )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 15)
+        for habit in response.data['results']:
+            self.assertEqual(list(habit), ['pk', 'time_to_do', 'action'])
+        # Количество и страница, связанные привычки не загружаются
+        count, page = context.captured_queries
+        self.assertNotIn('"reward"', page['sql'])
+        self.assertNotIn('"place"', page['sql'])
+        self.assertIn('"action"', page['sql'])
+
+    def test_retrieve(self):
+        """Тест одной привычки со связанными привычками
+        """
+        habit = self.habits[2]
+        url = reverse('habits:habit_retrieve', args=(habit.pk,))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'{url}?fields=pk,related_habit')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = HabitRetieveSearilizer(habit).data
+        self.assertEqual(response.data, {
+            'pk': habit.pk,
+            'related_habit': expected['related_habit'],
+            })
+        self.assertEqual(len(expected['related_habit']), 2)
+        self.assertNotIn('"action"', context.captured_queries[0]['sql'])
+
+    def test_unknown_field(self):
+        """Тест неизвестного поля
+        """
+        response = self.client.get(
+            f'{reverse("habits:habit_list_private")}?fields=pk,owner',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
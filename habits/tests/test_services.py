@@ -1,13 +1,16 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 from rest_framework.test import APITestCase
 
 from django_celery_beat.models import CrontabSchedule
 
+from habits.models import Habit
 from habits.services import (construct_time_to_task,
                              construct_periodic,
+                             publish_habit_chain,
                              )
 
 
@@ -393,3 +396,65 @@ class TestServices(APITestCase):
                 tzinfo=timezone.get_current_timezone(),
                 ),
             )
+
+
+class TestPublishHabitChain(APITestCase):
+    """Тест изменения публичности цепочки привычек
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.cron = CrontabSchedule.objects.create(hour=18, minute=30)
+        self.interval = CrontabSchedule.objects.create(minute='*',
+                                                       hour='*',
+                                                       day_of_month='*/1',
+                                                       )
+
+    def create_habit(self, related_habit=None):
+        return Habit.objects.create(owner=self.user,
+                                    place='test_place',
+                                    time_to_do=self.cron,
+                                    action='test_actions',
+                                    is_nice_habit=False,
+                                    related_habit=related_habit,
+                                    periodic=self.interval,
+                                    time_to_done=timedelta(minutes=1),
+                                    is_published=False,
+                                    )
+
+    def test_publish_chain(self):
+        """Тест обновления цепочки любой длины одним запросом
+        """
+        chain = [self.create_habit()]
+        for _ in range(5):
+            chain.append(self.create_habit(related_habit=chain[-1]))
+        # Ветка от середины цепочки
+        chain.append(self.create_habit(related_habit=chain[2]))
+        other = self.create_habit()
+
+        with self.assertNumQueries(1):
+            count = publish_habit_chain(chain[3], True)
+
+        self.assertEqual(count, len(chain))
+        self.assertEqual(
+            set(Habit.objects.filter(
+                is_published=True,
+                ).values_list('pk', flat=True)),
+            {habit.pk for habit in chain},
+            )
+        other.refresh_from_db()
+        self.assertFalse(other.is_published)
+
+    def test_publish_cycle(self):
+        """Тест цепочки замкнутой в цикл
+        """
+        first = self.create_habit()
+        second = self.create_habit(related_habit=first)
+        third = self.create_habit(related_habit=second)
+        Habit.objects.filter(pk=first.pk).update(related_habit=third)
+
+        self.assertEqual(publish_habit_chain(first, True), 3)
+        self.assertEqual(publish_habit_chain(second, True), 0)
@@ -1,6 +1,263 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime, timedelta
+from unittest import mock
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from aiogram import Bot, Dispatcher
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import (SimpleTestCase,
+                         TestCase,
+                         TransactionTestCase,
+                         override_settings,
+                         )
+from django.utils import timezone
+
+from django_celery_beat.models import CrontabSchedule
+
+from habits.cache import MISSING
+from habits.models import Habit, PeriodUnit
+from habits.telegram_bot import db
+from habits.telegram_bot.utils import (construct_schedule,
+                                       get_minute_of_day,
+                                       render_habits,
+                                       render_next_habit,
+                                       )
+from habits.telegram_bot.webhook import (construct_webhook_url,
+                                         create_webhook_app,
+                                         )
 
 
 class TestTelegram(TestCase):
     """Тесты касающиеся телеграма
     """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         )
+        self.interval = CrontabSchedule.objects.create(minute='*',
+                                                       hour='*/3',
+                                                       day_of_month='*',
+                                                       )
+        for hour, action in ((10, 'late'), (9, 'early')):
+            Habit.objects.create(
+                owner=self.user,
+                place='test_place',
+                time_to_do=CrontabSchedule.objects.create(hour=hour,
+                                                          minute=5,
+                                                          ),
+                action=action,
+                is_nice_habit=False,
+                periodic=self.interval,
+                time_to_done=timedelta(minutes=1),
+                )
+
+    def test_fill_schedule(self):
+        """Тест числовых полей расписания привычки
+        """
+        habit = Habit.objects.get(action='early')
+
+        self.assertEqual(habit.minute_of_day, 9 * 60 + 5)
+        self.assertEqual(habit.period_unit, PeriodUnit.HOURS)
+        self.assertEqual(habit.period_count, 3)
+        self.assertEqual(construct_schedule(habit),
+                         ('9:05', 'Каждые 3 часа'),
+                         )
+
+    def test_schedule_without_fields(self):
+        """Тест расписания привычки без заполненных числовых полей
+        """
+        self.assertEqual(construct_schedule(Habit()), (None, None))
+        self.assertEqual(
+            construct_schedule(Habit(minute_of_day=65,
+                                     period_unit=PeriodUnit.DAYS,
+                                     )),
+            ('1:05', None),
+            )
+
+    def test_ordering_by_minute_of_day(self):
+        """Тест сортировки по времени числом, а не строкой
+        """
+        with self.assertNumQueries(1) as context:
+            actions = list(Habit.objects.values_list('action', flat=True))
+
+        self.assertEqual(actions, ['early', 'late'])
+        self.assertNotIn('JOIN', context.captured_queries[0]['sql'])
+
+    def test_render_next_habit(self):
+        """Тест вывода следующей привычки
+        """
+        now = datetime(2024, 7, 1, 9, 30,
+                       tzinfo=timezone.get_current_timezone(),
+                       )
+        with mock.patch('habits.telegram_bot.utils.timezone.localtime',
+                        return_value=now,
+                        ):
+            minute_of_day = get_minute_of_day()
+        text = render_next_habit(Habit.objects.filter(
+            minute_of_day__gte=minute_of_day,
+            ).first())
+
+        self.assertEqual(minute_of_day, 9 * 60 + 30)
+        self.assertIn('late', text)
+        self.assertIn('10:05', text)
+        self.assertEqual(render_next_habit(None),
+                         'На сегодня привычек больше нет',
+                         )
+
+
+@override_settings(TELEGRAM_DB_POOL_MIN_SIZE=1, TELEGRAM_DB_POOL_MAX_SIZE=4)
+class TestBotDatabase(TransactionTestCase):
+    """Тесты запросов бота через пул asyncpg
+
+    Соединения пула не видят транзакцию TestCase,
+    поэтому данные фиксируются
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner',
+                                                         'owner@gmail.com',
+                                                         'ownerpass',
+                                                         tg_id=1000000,
+                                                         )
+        interval = CrontabSchedule.objects.create(minute='*',
+                                                  hour='*/3',
+                                                  day_of_month='*',
+                                                  )
+        habits = ((10, 'late', True), (9, 'early', False))
+        for hour, action, is_nice_habit in habits:
+            Habit.objects.create(
+                owner=self.user,
+                place='test_place',
+                time_to_do=CrontabSchedule.objects.create(hour=hour,
+                                                          minute=5,
+                                                          ),
+                action=action,
+                is_nice_habit=is_nice_habit,
+                periodic=interval,
+                time_to_done=timedelta(minutes=1),
+                )
+
+    async def test_queries(self):
+        """Тест запросов обработчиков одновременно через пул
+        """
+        try:
+            user, habits, next_habit, late, info = await asyncio.gather(
+                db.get_user(1000000),
+                db.get_habits(self.user.pk),
+                db.get_next_habit(self.user.pk, 9 * 60 + 30),
+                db.get_next_habit(self.user.pk, 23 * 60),
+                db.get_info(1000000),
+                )
+            missing = await db.get_user(1)
+            missing_info = await db.get_info(1)
+        finally:
+            await db.close_pool()
+
+        self.assertEqual(user['id'], self.user.pk)
+        self.assertEqual(user['username'], 'owner')
+        self.assertIsNone(missing)
+        self.assertIsNone(missing_info)
+        self.assertEqual([habit.action for habit in habits],
+                         ['early', 'late'],
+                         )
+        self.assertIn('⏱️ В какое время: 9:05', render_habits(habits))
+        self.assertEqual(next_habit[0].action, 'late')
+        self.assertEqual(construct_schedule(next_habit[0]),
+                         ('10:05', 'Каждые 3 часа'),
+                         )
+        self.assertEqual(late, (None, True))
+        self.assertEqual(dict(info), {'id': self.user.pk,
+                                      'username': 'owner',
+                                      'email': 'owner@gmail.com',
+                                      'phone': '',
+                                      'habits': 1,
+                                      'nice_habits': 1,
+                                      })
+
+    async def test_user_cache(self):
+        """Тест кэша пользователей и сброса по уведомлению
+        """
+        users = get_user_model().objects.filter(pk=self.user.pk)
+        try:
+            self.assertEqual((await db.get_user(1000000))['email'],
+                             'owner@gmail.com',
+                             )
+            self.assertIsNone(await db.get_user(2000000))
+            # update() минует User.save, запись остается в кэше
+            await users.aupdate(email='cached@gmail.com')
+            self.assertEqual((await db.get_user(1000000))['email'],
+                             'owner@gmail.com',
+                             )
+
+            user = await users.aget()
+            user.tg_id = 2000000
+            await user.asave(update_fields=('tg_id',))
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if db.user_cache.get(2000000) is MISSING:
+                    break
+
+            self.assertIsNone(await db.get_user(1000000))
+            self.assertEqual((await db.get_user(2000000))['email'],
+                             'cached@gmail.com',
+                             )
+        finally:
+            await db.close_pool()
+
+
+@override_settings(TELEGRAM_WEBHOOK_URL='https://example.com/',
+                   TELEGRAM_WEBHOOK_SECRET='secret',
+                   )
+class TestWebhook(SimpleTestCase):
+    """Тесты приема обновлений через webhook
+    """
+
+    async def test_webhook_secret(self):
+        """Тест проверки секрета и передачи обновления диспетчеру
+        """
+        dispatcher = Dispatcher()
+        bot = Bot(token='123:abc')
+        app = create_webhook_app(dispatcher, bot)
+        update = {'update_id': 1,
+                  'message': {'message_id': 1,
+                              'date': 0,
+                              'chat': {'id': 1, 'type': 'private'},
+                              'text': '/start',
+                              }}
+
+        with mock.patch.object(dispatcher,
+                               'feed_raw_update',
+                               new_callable=mock.AsyncMock,
+                               ) as feed_raw_update:
+            async with TestClient(TestServer(app)) as client:
+                response = await client.post('/telegram/webhook/',
+                                             json=update,
+                                             )
+                self.assertEqual(response.status, 401)
+
+                response = await client.post(
+                    '/telegram/webhook/',
+                    json=update,
+                    headers={'X-Telegram-Bot-Api-Secret-Token': 'secret'},
+                    )
+                self.assertEqual(response.status, 200)
+                # Обновление обрабатывается в фоне после ответа
+                await asyncio.sleep(0.01)
+
+        self.assertEqual(
+            construct_webhook_url(),
+            'https://example.com/telegram/webhook/',
+            )
+        feed_raw_update.assert_awaited_once()
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='')
+    def test_webhook_without_secret(self):
+        """Тест запрета webhook без секрета
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            create_webhook_app(Dispatcher(), Bot(token='123:abc'))
@@ -1,7 +1,10 @@
 from django.urls import path
 
 from habits.apps import HabitsConfig
-from habits.views import (HabitCreateAPIView,
+from habits.views import (HabitBulkCreateAPIView,
+                          HabitChainAPIView,
+                          HabitCreateAPIView,
+                          HabitExportAPIView,
                           HabitRetieveAPIView,
                           HabitListAPIView,
                           HabitUserListAPIView,
@@ -16,6 +19,10 @@ urlpatterns = [
          HabitCreateAPIView.as_view(),
          name='habit_create',
          ),
+    path('api/habit/create/bulk/',
+         HabitBulkCreateAPIView.as_view(),
+         name='habit_create_bulk',
+         ),
     path('api/habit/list/',
          HabitListAPIView.as_view(),
          name='habit_list',
@@ -24,6 +31,10 @@ urlpatterns = [
          HabitUserListAPIView.as_view(),
          name='habit_list_private',
          ),
+    path('api/habit/export/',
+         HabitExportAPIView.as_view(),
+         name='habit_export',
+         ),
     path('api/habit/update/<int:pk>/',
          HabitUpdateAPIView.as_view(),
          name='habit_update',
@@ -32,6 +43,10 @@ urlpatterns = [
          HabitRetieveAPIView.as_view(),
          name='habit_retrieve',
          ),
+    path('api/habit/chain/<int:pk>/',
+         HabitChainAPIView.as_view(),
+         name='habit_chain',
+         ),
     path('api/habit/delete/<int:pk>/',
          HabitDeleteAPIView.as_view(),
          name='habit_delete',
@@ -1,15 +1,39 @@
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django_celery_beat.models import PeriodicTask
 
+from habits.filters import HabitSearchFilter
 from habits.models import Habit
-from habits.serializers import (HabitCreateSearilizer,
+from habits.serializers import (HabitBulkCreateSearilizer,
+                                HabitCreateSearilizer,
+                                HabitRelatedRetieveSearilizer,
+                                HabitRetieveFastSearilizer,
                                 HabitRetieveSearilizer,
                                 )
 from habits.permissions import IsCurrentUser, IsAdmin
 from habits.paginators import PaginateHabits
+from habits.cache import get_or_compute
+from habits.mixins import ETagMixin, FastRepresentationMixin
+from habits.services import (bulk_create_habits,
+                             construct_private_list_key,
+                             construct_public_list_key,
+                             get_habit_chain,
+                             get_habit_owner,
+                             get_public_habits_version,
+                             get_user_habits_version,
+                             invalidate_reminders,
+                             invalidate_habit_lists,
+                             is_public_page_cached,
+                             remember_habit_owner,
+                             stream_habits_csv,
+                             stream_habits_ndjson,
+                             )
 
 
 class HabitCreateAPIView(generics.CreateAPIView):
@@ -34,40 +58,179 @@ class HabitCreateAPIView(generics.CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class HabitRetieveAPIView(generics.RetrieveAPIView):
+class HabitBulkCreateAPIView(generics.GenericAPIView):
+    """Создание нескольких привычек одним запросом
+
+    Невалидные привычки не мешают созданию остальных,
+    их ошибки возвращаются с индексом в списке
+    """
+    queryset = Habit.objects.get_queryset()
+    serializer_class = HabitBulkCreateSearilizer
+
+    def get_related_habits(self, items: list) -> dict:
+        """Связанные привычки пачки одним запросом,
+        чужие привычки не загружаются
+        """
+        related_ids = set()
+        for item in items:
+            try:
+                related_ids.add(int(item['related_habit']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        if not related_ids:
+            return {}
+        return Habit.objects.filter(
+            owner=self.request.user,
+            ).in_bulk(related_ids)
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return Response(data={
+                'non_field_errors': 'Ожидается список привычек',
+                }, status=status.HTTP_400_BAD_REQUEST,
+                            )
+        if len(request.data) > settings.HABIT_BULK_CREATE_LIMIT:
+            return Response(data={
+                'non_field_errors':
+                    'За один запрос можно создать не более '
+                    f'{settings.HABIT_BULK_CREATE_LIMIT} привычек',
+                }, status=status.HTTP_400_BAD_REQUEST,
+                            )
+
+        context = self.get_serializer_context()
+        context['related_habits'] = self.get_related_habits(request.data)
+        valid, errors = [], []
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer_class()(data=item,
+                                                     context=context,
+                                                     )
+            if serializer.is_valid():
+                valid.append(serializer)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        habits = bulk_create_habits(
+            request.user,
+            [serializer.validated_data for serializer in valid],
+            ) if valid else []
+        if habits:
+            invalidate_habit_lists(
+                request.user.pk,
+                any(habit.is_published for habit in habits),
+                )
+        created = [
+            serializer.to_representation(
+                serializer.construct_result(
+                    dict(serializer.validated_data, pk=habit.pk),
+                    ),
+                )
+            for serializer, habit in zip(valid, habits)
+            ]
+        return Response(
+            data={'created': created, 'errors': errors},
+            status=(status.HTTP_201_CREATED
+                    if created else status.HTTP_400_BAD_REQUEST),
+            )
+
+
+class HabitRetieveAPIView(ETagMixin,
+                          FastRepresentationMixin,
+                          generics.RetrieveAPIView,
+                          ):
     """Показание привычки
     """
-    queryset = Habit.objects.get_queryset().select_related('owner',
-                                                           'time_to_do',
-                                                           'related_habit',
-                                                           'periodic',
-                                                           )
+    queryset = Habit.objects.get_queryset()
     serializer_class = HabitRetieveSearilizer
     permission_classes = [permissions.IsAuthenticated &
                           (IsCurrentUser | IsAdmin)]
 
+    def get_object(self):
+        instance = super().get_object()
+        remember_habit_owner(instance)
+        return instance
+
+    def get_etag_version(self, request):
+        """Версия привычек владельца
+
+        Владелец берется из кэша, пока он неизвестен или привычка
+        чужая, ETag не строится и запрос проходит проверку прав
+        """
+        owner_id = get_habit_owner(self.kwargs['pk'])
+        if owner_id is None:
+            return
+        if owner_id != request.user.pk and not request.user.is_superuser:
+            return
+        return get_user_habits_version(owner_id)
+
+
+class HabitChainAPIView(generics.GenericAPIView):
+    """Цепочка связанных привычек
+
+    Все привычки цепочки в обе стороны от привычки
+    загружаются одним рекурсивным запросом,
+    права проверяются как при показе привычки
+    """
+    queryset = Habit.objects.get_queryset()
+    serializer_class = HabitRelatedRetieveSearilizer
+    fast_serializer_class = HabitRetieveFastSearilizer
+    permission_classes = [permissions.IsAuthenticated &
+                          (IsCurrentUser | IsAdmin)]
+
+    def get(self, request, *args, **kwargs):
+        rows = get_habit_chain(
+            self.kwargs['pk'],
+            self.fast_serializer_class.related_columns + ('owner_id',),
+            )
+        habit = next((row for row in rows if row['id'] == self.kwargs['pk']),
+                     None,
+                     )
+        if habit is None:
+            raise NotFound()
+        self.check_object_permissions(
+            request,
+            Habit(pk=habit['id'], owner_id=habit['owner_id']),
+            )
+        return Response([self.fast_serializer_class.represent_related(row)
+                         for row in rows])
+
 
-class HabitListAPIView(generics.ListAPIView):
+class HabitListAPIView(ETagMixin,
+                       FastRepresentationMixin,
+                       generics.ListAPIView,
+                       ):
     """Список публичных привычек
     """
-    queryset = Habit.objects.filter(Q(is_published=True),
-                                    ).select_related('owner',
-                                                     'time_to_do',
-                                                     'related_habit',
-                                                     'periodic',
-                                                     )
+    queryset = Habit.objects.filter(
+        Q(is_published=True),
+        )
     serializer_class = HabitRetieveSearilizer
     pagination_class = PaginateHabits
+    filterset_class = HabitSearchFilter
 
+    def list(self, request, *args, **kwargs):
+        """Первые страницы ленты из общего для всех пользователей кэша
+        """
+        if not is_public_page_cached(request):
+            return super().list(request, *args, **kwargs)
+        construct_list = super().list
+        data = get_or_compute(
+            construct_public_list_key(request),
+            lambda: construct_list(request, *args, **kwargs).data,
+            settings.HABITS_LIST_CACHE_TIMEOUT,
+            )
+        return Response(data)
 
-class HabitUserListAPIView(generics.ListAPIView):
+    def get_etag_version(self, request):
+        return get_public_habits_version()
+
+
+class HabitUserListAPIView(ETagMixin,
+                           FastRepresentationMixin,
+                           generics.ListAPIView,
+                           ):
     """Список личных привычек
     """
-    queryset = Habit.objects.get_queryset().select_related('owner',
-                                                           'time_to_do',
-                                                           'related_habit',
-                                                           'periodic',
-                                                           )
+    queryset = Habit.objects.get_queryset()
     serializer_class = HabitRetieveSearilizer
     pagination_class = PaginateHabits
 
@@ -77,6 +240,61 @@ class HabitUserListAPIView(generics.ListAPIView):
             return queryset.filter(Q(owner=self.request.user))
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """Список из кэша по версии привычек пользователя,
+        список администратора со всеми привычками не кэшируется
+        """
+        if request.user.is_superuser:
+            return super().list(request, *args, **kwargs)
+        construct_list = super().list
+        data = get_or_compute(
+            construct_private_list_key(request),
+            lambda: construct_list(request, *args, **kwargs).data,
+            settings.HABITS_LIST_CACHE_TIMEOUT,
+            )
+        return Response(data)
+
+    def get_etag_version(self, request):
+        if request.user.is_superuser:
+            return
+        return get_user_habits_version(request.user.pk)
+
+
+class HabitExportAPIView(generics.GenericAPIView):
+    """Выгрузка всех привычек пользователя
+
+    Ответ отдается потоком в NDJSON или CSV по параметру type,
+    привычки читаются курсором пачками, поэтому память
+    не зависит от числа привычек
+    """
+    queryset = Habit.objects.get_queryset()
+    export_query_param = 'type'
+    export_types = {
+        'ndjson': (stream_habits_ndjson, 'application/x-ndjson'),
+        'csv': (stream_habits_csv, 'text/csv'),
+        }
+
+    def get(self, request, *args, **kwargs):
+        export_type = request.query_params.get(self.export_query_param,
+                                               'ndjson',
+                                               )
+        if export_type not in self.export_types:
+            return Response(data={
+                self.export_query_param:
+                    'Доступные форматы: '
+                    f'{", ".join(self.export_types)}',
+                }, status=status.HTTP_400_BAD_REQUEST,
+                            )
+        stream, content_type = self.export_types[export_type]
+        response = StreamingHttpResponse(
+            stream(self.get_queryset().filter(owner=request.user)),
+            content_type=f'{content_type}; charset=utf-8',
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="habits.{export_type}"'
+            )
+        return response
+
 
 class HabitUpdateAPIView(generics.UpdateAPIView):
     """Обновление привычки
@@ -85,6 +303,7 @@ class HabitUpdateAPIView(generics.UpdateAPIView):
                                                            'time_to_do',
                                                            'related_habit',
                                                            'periodic',
+                                                           'task',
                                                            )
     serializer_class = HabitCreateSearilizer
     permission_classes = [permissions.IsAuthenticated &
@@ -99,5 +318,12 @@ class HabitDeleteAPIView(generics.DestroyAPIView):
                           (IsCurrentUser | IsAdmin)]
 
     def perform_destroy(self, instance):
-        PeriodicTask.objects.filter(name__contains=f'_{instance.pk}').delete()
-        return super().perform_destroy(instance)
+        # Версии увеличиваются после фиксации удаления, иначе
+        # параллельный запрос закэширует привычку под новой версией
+        with transaction.atomic():
+            task_id = instance.task_id
+            invalidate_reminders(instance)
+            invalidate_habit_lists(instance.owner_id, instance.is_published)
+            super().perform_destroy(instance)
+            if task_id is not None:
+                PeriodicTask.objects.filter(pk=task_id).delete()
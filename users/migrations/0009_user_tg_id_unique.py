@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Уникальный индекс id чата, бот ищет пользователя по нему
+    на каждое сообщение. NULL допускается многократно.
+    Если чат привязан к нескольким пользователям,
+    привязка остается у пользователя с наименьшим id
+    """
+
+    dependencies = [
+        ('users', '0008_alter_user_phone_alter_user_tg_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                UPDATE users_user
+                SET tg_id = NULL
+                WHERE id IN (
+                    SELECT id
+                    FROM (
+                        SELECT id,
+                               MIN(id) OVER (PARTITION BY tg_id) AS keep_id
+                        FROM users_user
+                        WHERE tg_id IS NOT NULL
+                    ) AS ranked
+                    WHERE id <> keep_id
+                )
+                """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='tg_id',
+            field=models.BigIntegerField(blank=True, help_text='ID чата в Telegram,                                    нужен для итеграции с                                    Телеграмом и рассылки напоминаний', null=True, unique=True, verbose_name='ID чата в телеграмме'),
+        ),
+    ]
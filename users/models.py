@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models
 
 from phonenumber_field.modelfields import PhoneNumberField
 # Create your models here.
@@ -17,8 +18,30 @@ class User(AbstractUser):
     tg_id = models.BigIntegerField(verbose_name='ID чата в телеграмме',
                                    null=True,
                                    blank=True,
+                                   unique=True,
                                    editable=True,
                                    help_text='ID чата в Telegram,\
                                     нужен для итеграции с\
                                     Телеграмом и рассылки напоминаний'
                                    )
+
+    # Поля пользователя которые бот кэширует по id чата
+    BOT_FIELDS = ('username', 'email', 'phone', 'tg_id')
+
+    def save(self, *args, **kwargs) -> None:
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.BOT_FIELDS):
+            self.notify_bot()
+
+    def notify_bot(self) -> None:
+        """Сброс пользователя в кэше процессов бота
+
+        Уведомление PostgreSQL доставляется после фиксации
+        транзакции и не доставляется при ее откате
+        """
+        with connections[self._state.db].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [
+                settings.TELEGRAM_USER_CHANNEL,
+                f'{self.pk}:{self.tg_id or ""}',
+                ])
@@ -3,11 +3,11 @@ from rest_framework.permissions import BasePermission
 
 class IsCurrentUser(BasePermission):
     """Проверка на текущего пользователя
+
+    Проверяется на объекте уже загруженном get_object
     """
-    def has_permission(self, request, view):
-        pk = view.kwargs['pk']
-        user = view.queryset.get(pk=pk)
-        return request.user == user
+    def has_object_permission(self, request, view, obj):
+        return obj.pk == request.user.pk
 
 
 class IsSuperUser(BasePermission):
@@ -4,6 +4,7 @@ from rest_framework.exceptions import ErrorDetail
 
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 
 from users.validators import ValidatorSetPasswordUser
 
@@ -131,6 +132,33 @@ class TestUserApi(APITestCase):
         self.assertFalse(get_user_model().objects.filter(username='test',
                                                          ).exists())
 
+    def test_update_user_block_permission(self):
+        """Тест блокировки изменения чужого пользователя
+        """
+        user = get_user_model().objects.create(username='test',
+                                               phone='+7 (900) 900 1000',
+                                               email='test@gmail.com',
+                                               password='testroot',
+                                               )
+        stranger = get_user_model().objects.create(username='stranger',
+                                                   phone='+7 (900) 900 2000',
+                                                   email='other@gmail.com',
+                                                   password='testroot',
+                                                   )
+        self.client.force_authenticate(user=stranger)
+        url = reverse('users:user_update', kwargs={'pk': user.pk})
+
+        with self.assertNumQueries(1):
+            response = self.client.patch(url,
+                                         {'username': 'change'},
+                                         format='json',
+                                         )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).username,
+                         'test',
+                         )
+
     def test_change_activity_user(self):
         """Тест изменения активности пользователя
         """
@@ -149,6 +177,24 @@ class TestUserApi(APITestCase):
         self.assertFalse(get_user_model().objects.get(username='test',
                                                       ).is_active)
 
+    def test_unique_tg_id(self):
+        """Тест уникальности id чата при допустимых пустых значениях
+        """
+        for number in range(2):
+            get_user_model().objects.create(username=f'test_{number}',
+                                            phone=f'+7 (900) 900 100{number}',
+                                            )
+        get_user_model().objects.create(username='linked',
+                                        phone='+7 (900) 900 1002',
+                                        tg_id=1000000,
+                                        )
+
+        with self.assertRaises(IntegrityError):
+            get_user_model().objects.create(username='duplicate',
+                                            phone='+7 (900) 900 1003',
+                                            tg_id=1000000,
+                                            )
+
     def test_validator_set_password_user(self):
         """Проверка валидатора для пользователя
         """